@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+#
+# Actor/learner training across CPU cores (train.py --workers N).
+#
+# Every actor process owns a DoomGame and plays with a copy of the weights.
+# Instead of learning, it ships its transitions to the learner in batches:
+# the feature vector of the action taken, the feature matrix of the next
+# state (one row per action), the reward and whether the next state is
+# terminal. The learner, in the main process, applies the TD updates and
+# every --sync-every updates publishes its weights to shared memory, where
+# the actors pick them up before their next decision.
+#
+# usage: python train.py --scenario "health gathering supreme" --fast --workers 8
+#
+
+from __future__ import print_function, division
+
+from qlearningAgent import ApproximateQAgent
+import copy, multiprocessing, random, timeit
+import numpy as np
+import doomUtils, extractor, train
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class ActorAgent(ApproximateQAgent):
+    """
+    Plays with the learner's latest published weights, and sends its
+    transitions to the learner instead of learning from them.
+    """
+    def __init__(self, featureExtractor, sharedWeights, version, transitions,
+                 workerId, batchSize):
+        ApproximateQAgent.__init__(self, extractor=featureExtractor)
+        self.sharedWeights = sharedWeights
+        self.version       = version
+        self.seen          = -1
+        self.transitions   = transitions
+        self.workerId      = workerId
+        self.batchSize     = batchSize
+        self.batch         = []
+        self.syncWeights()
+
+    def syncWeights(self):
+        """
+        Copies the weights if the learner published new ones.
+        """
+        if self.version.value == self.seen:
+            return
+        with self.sharedWeights.get_lock():
+            self.seen = self.version.value
+            self.weights[:] = np.frombuffer(self.sharedWeights.get_obj())
+        # Invalidates the q-values cached with the old weights.
+        self.updates += 1
+
+    def update(self, state, action, nextState, reward):
+        """
+        Queues the transition for the learner
+        """
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        featureExtractor = self.getExtractor(scenario)
+
+        a = all_actions.index(action)
+        featureVector = featureExtractor.getFeatureMatrix(state)[a]
+        if nextState[5]:
+            nextFeatures = np.zeros((len(all_actions), len(featureVector)))
+        else:
+            nextFeatures = featureExtractor.getFeatureMatrix(nextState)
+
+        self.batch.append((featureVector, nextFeatures, reward, nextState[5]))
+        if len(self.batch) >= self.batchSize:
+            self.flush()
+
+        self.syncWeights()
+
+    def flush(self):
+        """
+        Sends the queued transitions to the learner as four arrays.
+        """
+        if not self.batch:
+            return
+        featureVectors, nextFeatures, rewards, terminals = zip(*self.batch)
+        self.transitions.put(("transitions", self.workerId,
+                              np.array(featureVectors), np.array(nextFeatures),
+                              np.array(rewards, dtype=float),
+                              np.array(terminals, dtype=bool)))
+        self.batch = []
+
+
+"""
+# Function: workerOptions
+# -----------------------
+# Sets up a worker process: its counts start at zero, its random state is
+# its own, and its options are a copy of the trainer's in --fast mode,
+# with a seed of its own when --seed is given.
+#
+# returns: the worker's options
+"""
+def workerOptions(workerId, options):
+    # Forked workers start with a copy of the trainer's counts.
+    doomUtils.counts.clear()
+
+    options = copy.copy(options)
+    options.fast = True
+    if options.seed is not None:
+        options.seed += workerId + 1
+    # Forked workers would otherwise share the trainer's random state.
+    random.seed(options.seed)
+    np.random.seed(options.seed)
+    return options
+
+
+"""
+# Function: actorProcess
+# ----------------------
+# Plays a number of episodes in its own DoomGame, always in --fast mode.
+# Reports every episode's total reward and, when done, its counts.
+#
+# workerId:      the actor's number, from 0
+# options:       the parsed command line options
+# episodes:      how many episodes to play
+# sharedWeights: the multiprocessing.Array the learner publishes weights to
+# version:       the multiprocessing.Value bumped on every publish
+# transitions:   the multiprocessing.Queue to the learner
+"""
+def actorProcess(workerId, options, episodes, sharedWeights, version, transitions):
+    options  = workerOptions(workerId, options)
+    scenario = options.scenario
+    settings = train.scenarios[scenario]
+    featureExtractor = extractor.getExtractor(scenario)
+
+    game        = train.createGame(settings, options, featureExtractor)
+    all_actions = settings["actions"](game.get_available_buttons_size())
+    skiprate    = options.skiprate or settings["skiprate"]
+    agent       = ActorAgent(featureExtractor, sharedWeights, version, transitions,
+                             workerId, options.batch_size)
+
+    for i in range(episodes):
+        game.new_episode()
+        doomUtils.playEpisode(game, agent, scenario, all_actions, skiprate=skiprate)
+        agent.flush()
+        transitions.put(("episode", workerId, game.get_total_reward()))
+
+    game.close()
+    transitions.put(("done", workerId, dict(doomUtils.counts)))
+
+
+"""
+# Function: publish
+# -----------------
+# Copies the learner's weights to shared memory for the actors.
+"""
+def publish(agent, sharedWeights, version):
+    with sharedWeights.get_lock():
+        np.frombuffer(sharedWeights.get_obj())[:] = agent.weights
+        version.value += 1
+
+
+"""
+# Function: splitEpisodes
+# -----------------------
+# Splits the episodes as evenly as possible between the workers.
+"""
+def splitEpisodes(episodes, workers):
+    return [episodes // workers + (1 if i < episodes % workers else 0)
+            for i in range(workers)]
+
+
+"""
+# Function: startWorkers
+# ----------------------
+# Starts a worker process per share of the episodes.
+#
+# target: the worker function, called with the worker's number, the
+#         options, its episodes and then args
+#
+# returns: the started processes
+"""
+def startWorkers(target, options, episodes, args):
+    workers   = max(1, min(options.workers, episodes))
+    processes = [multiprocessing.Process(target=target,
+                                         args=(i, options, n) + tuple(args))
+                 for i, n in enumerate(splitEpisodes(episodes, workers))]
+    for p in processes:
+        p.daemon = True
+        p.start()
+    return processes
+
+
+"""
+# Function: receive
+# -----------------
+# Receives the workers' messages until every worker is done, and then joins
+# them. Episode results are printed and the workers' counts are added to
+# doomUtils.counts; any other message is yielded.
+#
+# processes: the worker processes
+# messages:  the multiprocessing.Queue the workers send their messages to
+"""
+def receive(processes, messages):
+    played = 0
+    done   = 0
+    while done < len(processes):
+        try:
+            message = messages.get(timeout=1)
+        except queue.Empty:
+            for p in processes:
+                if p.exitcode not in (None, 0):
+                    raise RuntimeError("worker process %s exited with code %d"
+                                       % (p.name, p.exitcode))
+            continue
+
+        kind, workerId = message[0], message[1]
+        if kind == "episode":
+            played += 1
+            print("Episode #" + str(played), "(worker " + str(workerId) + ")",
+                  "total reward:", message[2])
+        elif kind == "done":
+            done += 1
+            for key, value in message[2].items():
+                doomUtils.counts[key] += value
+        else:
+            yield message
+
+    for p in processes:
+        p.join()
+
+
+"""
+# Function: trainActors
+# ---------------------
+# Trains an agent with options.workers actor processes and a learner in
+# this process. The actors' counts are added to doomUtils.counts.
+#
+# options:  the parsed command line options
+# episodes: how many training episodes to play, over all actors
+#
+# returns: the learner's agent
+"""
+def trainActors(options, episodes):
+    featureExtractor = extractor.getExtractor(options.scenario)
+    agent            = ApproximateQAgent(extractor=featureExtractor)
+
+    sharedWeights = multiprocessing.Array("d", len(agent.weights))
+    version       = multiprocessing.Value("i", 0)
+    transitions   = multiprocessing.Queue(maxsize=16 * options.workers)
+    processes     = startWorkers(actorProcess, options, episodes,
+                                 (sharedWeights, version, transitions))
+
+    start     = timeit.default_timer()
+    published = 0
+    for message in receive(processes, transitions):
+        for transition in zip(*message[2:]):
+            agent.learn(*transition)
+        if agent.updates - published >= options.sync_every:
+            publish(agent, sharedWeights, version)
+            published = agent.updates
+
+    elapsed = timeit.default_timer() - start
+    if elapsed > 0:
+        print("Actors: %d, transitions learned: %d, transitions per second: %.1f"
+              % (len(processes), agent.updates, agent.updates / elapsed))
+    return agent
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+#
+# Batch least-squares learning over a feature dataset (see
+# featureDataset.py), as an alternative to the agent's one SGD step per
+# transition. With a handful of features per scenario, every iteration is
+# a solve of a tiny linear system, so the weights converge in a few passes
+# over the data.
+#
+# lspi: least-squares policy iteration. Every iteration solves LSTD-Q for
+#       the greedy policy of the last weights:
+#       (X' (X - gamma X'') + reg I) w = X' r
+#       where X holds the features of the actions taken and X'' those of
+#       the greedy actions in the next states.
+# fqi:  fitted Q-iteration. Every iteration fits the weights to the targets
+#       r + gamma max_a Q(next state, a) by ridge regression.
+#
+# gamma is per transition: gamma to the power of the decisions between two
+# recorded frames (see featureDataset.discounts), so recordings of every
+# Nth decision are discounted like the decisions they stand for.
+#
+# The weights are saved as a checkpoint the agent loads with
+# train.py --evaluate. With --target-reward, the weights of every iteration
+# are played in the engine until they reach the target, and so is an online
+# agent, to compare the wall-clock time of both.
+#
+# usage: python batchLearner.py datasets/supreme supreme.npz --method lspi
+#        python batchLearner.py datasets/center center.npz --target-reward 5
+#
+
+from __future__ import print_function, division
+
+from qlearningAgent import ApproximateQAgent
+import argparse, timeit
+import numpy as np
+import checkpoint, doomUtils, extractor, featureDataset
+
+
+"""
+# Function: solve
+# ---------------
+# Solves A w = b, in the least squares sense if A is singular (when a
+# feature never fires and there is no regularization).
+"""
+def solve(A, b):
+    try:
+        return np.linalg.solve(A, b)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(A, b, rcond=None)[0]
+
+
+"""
+# Function: greedyFeatures
+# ------------------------
+# The feature vectors of the greedy actions of weights in every next state.
+"""
+def greedyFeatures(nextFeatures, weights):
+    greedy = nextFeatures.dot(weights).argmax(axis=1)
+    return nextFeatures[np.arange(len(nextFeatures)), greedy]
+
+
+"""
+# Function: lstdq
+# ---------------
+# LSTD-Q: the weights of the Q-function of the greedy policy of weights.
+# Terminal transitions have zero next features, see featureDataset.
+# gamma is a number or an array of one discount per transition, as is
+# fqi's.
+"""
+def lstdq(transitions, weights, gamma, regularization):
+    features, nextFeatures, rewards, terminals = transitions
+    nextGreedy = greedyFeatures(nextFeatures, weights)
+    A = features.T.dot(features - np.reshape(gamma, (-1, 1)) * nextGreedy)
+    A += regularization * np.eye(len(weights))
+    return solve(A, features.T.dot(rewards))
+
+
+"""
+# Function: lspi
+# --------------
+# Least-squares policy iteration, from zero weights.
+#
+# returns: a generator of the weights after every iteration
+"""
+def lspi(transitions, gamma, regularization, iterations):
+    weights = np.zeros(transitions[0].shape[1])
+    for i in range(iterations):
+        weights = lstdq(transitions, weights, gamma, regularization)
+        yield weights
+
+
+"""
+# Function: fqi
+# -------------
+# Fitted Q-iteration with ridge regression, from zero weights. The
+# regularized Gram matrix is the same every iteration, so only the targets
+# change.
+#
+# returns: a generator of the weights after every iteration
+"""
+def fqi(transitions, gamma, regularization, iterations):
+    features, nextFeatures, rewards, terminals = transitions
+    gram    = features.T.dot(features) + regularization * np.eye(features.shape[1])
+    weights = np.zeros(features.shape[1])
+    for i in range(iterations):
+        maxQ    = np.where(terminals, 0.0, nextFeatures.dot(weights).max(axis=1))
+        weights = solve(gram, features.T.dot(rewards + gamma * maxQ))
+        yield weights
+
+
+methods = {"lspi": lspi, "fqi": fqi}
+
+
+"""
+# Function: makeAgent
+# -------------------
+# An agent for the dataset's scenario, with weights given in the order of
+# the dataset's feature names.
+"""
+def makeAgent(dataset, weights):
+    agent = ApproximateQAgent(extractor=extractor.getExtractor(dataset["meta"]["scenario"]))
+    for name, w in zip(dataset["meta"]["featureNames"], weights):
+        agent.weights[agent.extractor.featureIndex[name]] = w
+    return agent
+
+
+"""
+# Function: playEpisodes
+# ----------------------
+# Plays episodes with an agent in the engine.
+#
+# returns: the mean total reward
+"""
+def playEpisodes(game, agent, scenario, all_actions, skiprate, episodes):
+    total = 0.0
+    for i in range(episodes):
+        game.new_episode()
+        doomUtils.playEpisode(game, agent, scenario, all_actions, skiprate=skiprate)
+        total += game.get_total_reward()
+    return total / episodes
+
+
+"""
+# Function: compareOnline
+# -----------------------
+# Plays the weights of every batch iteration, and then trains an online
+# agent, until the mean reward of evalEpisodes episodes reaches the target,
+# and reports the wall-clock time each took.
+#
+# iterations: a list of (seconds to compute, weights) per iteration
+"""
+def compareOnline(options, dataset, iterations):
+    import train
+
+    scenario  = dataset["meta"]["scenario"]
+    settings  = train.scenarios[scenario]
+    engine    = train.parseArgs(["--scenario", scenario, "--fast",
+                                 "--vizdoom-dir", options.vizdoom_dir] +
+                                (["--simulator"] if options.simulator else []))
+    featureExtractor = extractor.getExtractor(scenario)
+    game        = train.createGame(settings, engine, featureExtractor)
+    all_actions = settings["actions"](game.get_available_buttons_size())
+    skiprate    = settings["skiprate"]
+
+    start = timeit.default_timer()
+    solving = 0.0
+    for i, (seconds, weights) in enumerate(iterations):
+        solving += seconds
+        agent = makeAgent(dataset, weights)
+        agent.stopTraining()
+        reward = playEpisodes(game, agent, scenario, all_actions, skiprate,
+                              options.eval_episodes)
+        print("  batch iteration %d: mean reward %.2f" % (i + 1, reward))
+        if reward >= options.target_reward:
+            print("Batch: target reached after %d iterations, %.3f s solving, "
+                  "%.2f s with evaluation"
+                  % (i + 1, solving, solving + timeit.default_timer() - start))
+            break
+    else:
+        print("Batch: target not reached in %d iterations" % len(iterations))
+
+    agent = ApproximateQAgent(extractor=featureExtractor)
+    start = timeit.default_timer()
+    for episode in range(options.online_episodes):
+        playEpisodes(game, agent, scenario, all_actions, skiprate, 1)
+        if (episode + 1) % options.eval_episodes != 0:
+            continue
+        epsilon, alpha = agent.epsilon, agent.alpha
+        agent.epsilon, agent.alpha = 0.0, 0.0
+        reward = playEpisodes(game, agent, scenario, all_actions, skiprate,
+                              options.eval_episodes)
+        agent.epsilon, agent.alpha = epsilon, alpha
+        print("  online after %d episodes: mean reward %.2f" % (episode + 1, reward))
+        if reward >= options.target_reward:
+            print("Online: target reached after %d training episodes, %.2f s "
+                  "with evaluation" % (episode + 1, timeit.default_timer() - start))
+            break
+    else:
+        print("Online: target not reached in %d training episodes"
+              % options.online_episodes)
+
+    game.close()
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Learn weights from a feature dataset with LSPI or "
+                    "fitted Q-iteration.")
+    parser.add_argument("dataset", help="the dataset's directory")
+    parser.add_argument("checkpoint", help="where to save the weights")
+    parser.add_argument("--method", default="lspi", choices=sorted(methods.keys()))
+    parser.add_argument("--gamma", type=float, default=ApproximateQAgent().gamma)
+    parser.add_argument("--regularization", type=float, default=1e-3,
+                        help="ridge (L2) regularization (default: 1e-3)")
+    parser.add_argument("--iterations", type=int, default=20,
+                        help="most iterations (default: 20)")
+    parser.add_argument("--tolerance", type=float, default=1e-6,
+                        help="stop when no weight changes by more (default: 1e-6)")
+    parser.add_argument("--target-reward", type=float, default=None,
+                        help="compare the time to reach this mean reward "
+                             "in the engine with online training")
+    parser.add_argument("--eval-episodes", type=int, default=10,
+                        help="with --target-reward, episodes per evaluation")
+    parser.add_argument("--online-episodes", type=int, default=500,
+                        help="with --target-reward, most online training "
+                             "episodes")
+    parser.add_argument("--vizdoom-dir", default="../..",
+                        help="with --target-reward, the ViZDoom directory")
+    parser.add_argument("--simulator", action="store_true",
+                        help="with --target-reward, play the stand-in for "
+                             "the engine (doomSim.py)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parseArgs()
+
+    dataset     = featureDataset.load(options.dataset)
+    transitions = featureDataset.transitions(dataset)
+    print("%d transitions, features: %s"
+          % (len(transitions[2]), ", ".join(dataset["meta"]["featureNames"])))
+
+    gamma      = featureDataset.discounts(dataset, options.gamma)
+    iterations = []
+    weights    = np.zeros(transitions[0].shape[1])
+    start = last = timeit.default_timer()
+    for i, newWeights in enumerate(methods[options.method](
+            transitions, gamma, options.regularization, options.iterations)):
+        now    = timeit.default_timer()
+        change = np.abs(newWeights - weights).max()
+        iterations.append((now - last, newWeights))
+        print("  %s iteration %d: largest weight change %.3g, %.3f ms"
+              % (options.method, i + 1, change, (now - last) * 1000))
+        weights, last = newWeights, now
+        if change <= options.tolerance:
+            break
+    print("%s: %d iterations in %.3f s"
+          % (options.method, len(iterations), timeit.default_timer() - start))
+
+    agent = makeAgent(dataset, weights)
+    agent.gamma = options.gamma
+    size  = checkpoint.save(options.checkpoint, agent, dataset["meta"]["scenario"], 0)
+    print("Weights saved to %s (%d bytes); play them with "
+          "train.py --evaluate %s" % (options.checkpoint, size, options.checkpoint))
+    for name, w in sorted(agent.getWeights().items()):
+        print("  %-24s %10.4f" % (name, w))
+
+    if options.target_reward is not None:
+        compareOnline(options, dataset, iterations)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+#
+# Benchmarks for the perception and learning code of the ViZDoom q-learner.
+#
+# Frames are synthetic: a labels buffer with a number of rectangular objects
+# drawn into it, a matching list of labels and a depth buffer. They do not
+# need a running engine, so the numbers only measure our own Python code.
+#
+# usage: python benchmark.py
+#
+# Hogwild training is benchmarked in the real step loop by hogwildbench.py.
+#
+# The baseline functions at the bottom are shared by the benchmark suites
+# that keep their results as JSON baselines (see microbench.py).
+#
+
+from __future__ import print_function, division
+
+import json, os, platform, random, timeit
+import numpy as np
+import doomUtils, replay
+from qlearningAgent import ApproximateQAgent
+
+
+class Label():
+    """
+    A stand-in for a ViZDoom label: one object in the labels buffer.
+    """
+    def __init__(self, value, object_id, object_name, position):
+        self.value       = value
+        self.object_id   = object_id
+        self.object_name = object_name
+        self.object_position_x, self.object_position_y, self.object_position_z = position
+
+
+class Frame():
+    """
+    A stand-in for the ViZDoom game state returned by game.get_state().
+    """
+    def __init__(self, number, labels, labels_buffer, depth_buffer, game_variables):
+        self.number         = number
+        self.labels         = labels
+        self.labels_buffer  = labels_buffer
+        self.depth_buffer   = depth_buffer
+        self.game_variables = game_variables
+
+
+"""
+# Function: makeFrame
+# -------------------
+# Builds a reproducible synthetic frame with num_objects objects on screen.
+#
+# resolution:  a tuple of the resolution (width, height)
+# num_objects: how many labels are drawn into the labels buffer
+# names:       object names to cycle through for the labels
+# seed:        seed for the random placement of the objects
+#
+# returns: a Frame
+"""
+def makeFrame(resolution, num_objects, names=("Medikit",), seed=0):
+    width, height = resolution
+    rand = random.Random(seed)
+
+    labels_buf = np.zeros((height, width), dtype=np.uint8)
+    depth_buf  = np.zeros((height, width), dtype=np.uint8)
+    labels = []
+
+    # The depth buffer gets closer towards the bottom of the screen.
+    depth_buf[:, :] = np.linspace(255, 0, height, dtype=np.uint8)[:, np.newaxis]
+
+    for i in range(num_objects):
+        value = i + 1
+        w = rand.randint(4, max(5, width // 8))
+        h = rand.randint(4, max(5, height // 4))
+        x = rand.randint(0, width - w)
+        y = rand.randint(0, height - h)
+        labels_buf[y:y + h, x:x + w] = value
+        position = (rand.uniform(-500, 500), rand.uniform(-500, 500), 0.0)
+        labels.append(Label(value, 100 + i, names[i % len(names)], position))
+
+    return Frame(1, labels, labels_buf, depth_buf, [50.0, 100.0])
+
+
+"""
+# Function: extractObjectsLoop
+# ----------------------------
+# The original pure Python labels buffer scan (every 4th pixel), kept as the
+# reference doomUtils.extractObjects is measured against.
+"""
+def extractObjectsLoop(game_state, resolution, my_pos):
+    screen_width, screen_height = resolution
+    distances   = doomUtils.objectDistances(game_state, my_pos)
+    coordinates = doomUtils.objectCoordinates(game_state)
+    labels_buf  = game_state.labels_buffer
+
+    labels  = {}
+    objects = {}
+
+    for l in game_state.labels:
+        labels[l.value] = (l.object_id, l.object_name)
+
+    for row in range(0, screen_height, 4):
+        for col in range(0, screen_width, 4):
+            value = labels_buf[row][col]
+            if not (value == 0):
+                if not value in list(objects.keys()):
+                    objects[value] = [col, col, coordinates[value],
+                                      distances[value], labels[value][0],
+                                      labels[value][1]]
+                else:
+                    left, right, coords, dist, obj_id, obj_name = objects[value]
+                    if col < left:
+                        objects[value] = [col, right, coords,
+                                          dist, obj_id, obj_name]
+                    elif col > right:
+                        objects[value] = [left, col, coords,
+                                          dist, obj_id, obj_name]
+
+    return objects
+
+
+"""
+# Function: makeState
+# -------------------
+# Wraps a frame in the state tuple built by doomUtils.getGameState.
+"""
+def makeState(frame, resolution, scenario, all_actions, my_pos=(0.0, 0.0, 0.0)):
+    return (frame,
+            doomUtils.Perception(frame, resolution, my_pos),
+            all_actions,
+            None,
+            resolution,
+            False,
+            scenario)
+
+
+"""
+# Function: edgeDepthLoop
+# -----------------------
+# The original Python loop averaging the depth of the leftmost and rightmost
+# columns, kept as the reference doomUtils.DepthSectors is measured against.
+"""
+def edgeDepthLoop(depth_buf, resolution):
+    screen_width, screen_height = resolution
+    left_depth  = 0
+    right_depth = 0
+    for pixel in range(0, screen_height):
+        left_depth += int(depth_buf[pixel][0])
+        right_depth += int(depth_buf[pixel][screen_width - 1])
+    left_depth  /= float(screen_height)
+    right_depth /= float(screen_height)
+    return left_depth, right_depth
+
+
+class LoopQAgent(ApproximateQAgent):
+    """
+    The original action selection and update, which evaluate the features of
+    every action once for the max, again for the argmax, and again for the
+    next state in update. Kept as the reference ApproximateQAgent is
+    measured against.
+    """
+    def getQValue(self, state, action):
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        featureExtractor = self.getExtractor(scenario)
+        qSum = 0
+        for key, value in featureExtractor.getFeatures(state, action).items():
+            qSum += self.weights[featureExtractor.featureIndex[key]] * value
+        return qSum
+
+    def computeValueFromQValues(self, state):
+        if state[5]:
+            return 0.0
+        return max([self.getQValue(state, a) for a in state[2]])
+
+    def computeActionFromQValues(self, state):
+        if state[5]:
+            return None
+        maxQValue = self.computeValueFromQValues(state)
+        return random.choice([a for a in state[2]
+                              if self.getQValue(state, a) == maxQValue])
+
+    def update(self, state, action, nextState, reward):
+        scenario   = state[6]
+        maxQ       = self.computeValueFromQValues(nextState)
+        difference = (reward + self.gamma * maxQ) - self.getQValue(state, action)
+        featureExtractor = self.getExtractor(scenario)
+        for key, value in featureExtractor.getFeatures(state, action).items():
+            self.weights[featureExtractor.featureIndex[key]] += self.alpha * difference * value
+
+
+"""
+# Function: timeCall
+# ------------------
+# Times a function call.
+#
+# returns: the best per-call time in seconds over a few repeats.
+"""
+def timeCall(func, number=20, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def benchmarkExtractObjects():
+    my_pos = (0.0, 0.0, 0.0)
+    print("extractObjects: pure Python loop vs NumPy")
+    for resolution in [(320, 240), (640, 480)]:
+        for num_objects in [1, 8, 32]:
+            frame = makeFrame(resolution, num_objects)
+            perception = doomUtils.Perception(frame, resolution, my_pos)
+            loop  = timeCall(lambda: extractObjectsLoop(frame, resolution, my_pos))
+            vec   = timeCall(lambda: doomUtils.extractObjects(perception))
+            print("  %dx%d, %2d objects: loop %8.3f ms  numpy %8.3f ms  (%.1fx)"
+                  % (resolution[0], resolution[1], num_objects,
+                     loop * 1000, vec * 1000, loop / vec))
+
+
+"""
+# Function: edgeDepthSectors
+# --------------------------
+# The mean depth of the edge columns, like the health extractors get it.
+"""
+def edgeDepthSectors(depth_buf, width):
+    depth = doomUtils.DepthSectors(depth_buf, doomUtils.edgeRegions(width))
+    return depth.mean(0), depth.mean(-1)
+
+
+def benchmarkDepth():
+    print("depth statistics: Python edge column loop vs DepthSectors")
+    for resolution in [(320, 240), (640, 480)]:
+        depth_buf = makeFrame(resolution, 0).depth_buffer
+        width = resolution[0]
+        loop  = timeCall(lambda: edgeDepthLoop(depth_buf, resolution))
+        edges = timeCall(lambda: edgeDepthSectors(depth_buf, width))
+        bands = timeCall(lambda: doomUtils.DepthSectors(
+            depth_buf, doomUtils.evenRegions(width, 8)).percentile(10))
+        print("  %dx%d: loop %6.3f ms  edge sectors %6.3f ms  "
+              "8 bands with 10th percentile %6.3f ms"
+              % (resolution[0], resolution[1], loop * 1000, edges * 1000,
+                 bands * 1000))
+
+
+def benchmarkActionSelection(ticks=200, repeat=5):
+    resolution  = (640, 480)
+    scenario    = "health gathering supreme"
+    all_actions = [[True, False, False], [False, True, False],
+                   [False, False, True], [True, False, True],
+                   [False, True, True], [False, False, False]]
+
+    print("getAction + update: feature calls per tick, %d actions, "
+          "best of %d runs" % (len(all_actions), repeat))
+    for agentClass in [LoopQAgent, ApproximateQAgent]:
+        best = float("inf")
+        for run in range(repeat):
+            random.seed(0)
+            agent  = agentClass()
+            # New frames every run, since they cache their features.
+            states = [makeState(makeFrame(resolution, 4, ("Medikit", "Poison"), seed),
+                                resolution, scenario, all_actions)
+                      for seed in range(ticks + 1)]
+
+            doomUtils.counts["feature calls"] = 0
+            state = states[0]
+            start = timeit.default_timer()
+            for nextState in states[1:]:
+                action = agent.getAction(state)
+                agent.update(state, action, nextState, 1.0)
+                state = nextState
+            best = min(best, timeit.default_timer() - start)
+
+        print("  %-18s %5.1f feature calls/tick  %8.3f ms/tick"
+              % (agentClass.__name__, doomUtils.counts["feature calls"] / float(ticks),
+                 best * 1000 / ticks))
+
+
+def benchmarkSumTree(size=1000000, batch=32):
+    print("SumTree with %d priorities, batches of %d" % (size, batch))
+    rand = np.random.RandomState(0)
+    tree = replay.SumTree(size)
+    priorities = rand.random_sample(size)
+
+    fill = timeCall(lambda: tree.update(np.arange(size), priorities), number=1, repeat=3)
+    print("  bulk update of every priority %10.3f ms" % (fill * 1000))
+
+    indices = rand.randint(size, size=batch)
+    errors  = rand.random_sample(batch)
+    sample  = timeCall(lambda: tree.sample(batch), number=200)
+    update  = timeCall(lambda: tree.update(indices, errors), number=200)
+    print("  sample a batch                %10.3f ms" % (sample * 1000))
+    print("  update a batch's priorities   %10.3f ms" % (update * 1000))
+
+    # The O(n) alternative: recompute the distribution on every sample.
+    linear = timeCall(lambda: rand.choice(size, size=batch, p=priorities / priorities.sum()),
+                      number=5, repeat=3)
+    print("  np.random.choice over all     %10.3f ms" % (linear * 1000))
+
+
+"""
+# Function: saveBaseline
+# ----------------------
+# Writes benchmark results as a JSON baseline, with the machine and the
+# versions they were measured with.
+#
+# results: benchmark name -> {metric name: value}
+"""
+def saveBaseline(path, results):
+    baseline = {
+        "machine": platform.platform(),
+        "python":  platform.python_version(),
+        "numpy":   np.__version__,
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+"""
+# Function: loadBaseline
+# ----------------------
+# Reads a JSON baseline written by saveBaseline.
+#
+# returns: the baseline as a dict
+"""
+def loadBaseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+"""
+# Function: compareBaseline
+# -------------------------
+# Compares results with a baseline's, metric by metric, and prints every
+# comparison. Benchmarks or metrics missing from either side are skipped.
+#
+# results:   benchmark name -> {metric name: value}
+# baseline:  a baseline read by loadBaseline
+# metrics:   metric name -> (direction, slack): direction is 1 when lower
+#            is better (seconds, bytes) and -1 when higher is (steps per
+#            second); a change smaller than slack, in the metric's own
+#            units, is never a regression
+# tolerance: how much worse, relatively, a metric may get
+#
+# returns: a list of (benchmark, metric, baseline value, value) for every
+#          regression
+"""
+def compareBaseline(results, baseline, metrics, tolerance):
+    if baseline["machine"] != platform.platform():
+        print("Warning: the baseline was measured on %s" % baseline["machine"])
+
+    regressions = []
+    for name in sorted(results):
+        if not name in baseline["results"]:
+            continue
+        for metric, (direction, slack) in sorted(metrics.items()):
+            old = baseline["results"][name].get(metric)
+            new = results[name].get(metric)
+            if old is None or new is None:
+                continue
+            worse = direction * (new - old)
+            regressed = worse > slack and worse > tolerance * abs(old)
+            if regressed:
+                regressions.append((name, metric, old, new))
+            change = 100.0 * (new - old) / old if old else 0.0
+            print("  %-56s %-14s %12.6g -> %12.6g %+7.1f%%%s"
+                  % (name, metric, old, new, change,
+                     "  REGRESSION" if regressed else ""))
+    return regressions
+
+
+if __name__ == "__main__":
+    benchmarkExtractObjects()
+    benchmarkDepth()
+    benchmarkActionSelection()
+    benchmarkSumTree()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Checks that resuming from a checkpoint carries on a run exactly: a seeded
+# run of N training episodes and the same run stopped after N / 2 episodes
+# and resumed (train.py --resume) must end with the same weights and update
+# count. Every run is its own train.py process, like real runs are.
+#
+# usage: python checkResume.py --simulator
+#        python checkResume.py --scenario "health gathering supreme" --episodes 6
+#
+
+from __future__ import print_function
+
+import argparse, os, shutil, subprocess, sys, tempfile
+import numpy as np
+import checkpoint, train
+
+
+"""
+# Function: trainRun
+# ------------------
+# Runs train.py for a number of training episodes, saving a checkpoint.
+"""
+def trainRun(options, episodes, path, resume=None):
+    argv = [sys.executable, "train.py", "--scenario", options.scenario,
+            "--fast", "--seed", str(options.seed), "--episodes", str(episodes),
+            "--test", "0", "--checkpoint", path,
+            "--vizdoom-dir", options.vizdoom_dir]
+    if options.simulator:
+        argv.append("--simulator")
+    if resume is not None:
+        argv += ["--resume", resume]
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call(argv, stdout=devnull,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that a resumed run matches a full run.")
+    parser.add_argument("--scenario", default="basic",
+                        choices=sorted(train.scenarios.keys()))
+    parser.add_argument("--episodes", type=int, default=10,
+                        help="training episodes of the full run (default: 10)")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--simulator", action="store_true",
+                        help="play the stand-in for the engine (doomSim.py)")
+    parser.add_argument("--vizdoom-dir", default="../..",
+                        help="ViZDoom directory the config and wad paths "
+                             "are relative to")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options   = parseArgs()
+    directory = tempfile.mkdtemp(prefix="checkResume-")
+    try:
+        full, half, resumed = [os.path.join(directory, name + ".npz")
+                               for name in ["full", "half", "resumed"]]
+        trainRun(options, options.episodes, full)
+        trainRun(options, options.episodes // 2, half)
+        trainRun(options, options.episodes, resumed, resume=half)
+        full, resumed = checkpoint.load(full), checkpoint.load(resumed)
+    finally:
+        shutil.rmtree(directory)
+
+    print("Full run:    weights %s, %d updates"
+          % (full["weights"].tolist(), int(full["updates"])))
+    print("Resumed run: weights %s, %d updates"
+          % (resumed["weights"].tolist(), int(resumed["updates"])))
+    if (np.array_equal(full["weights"], resumed["weights"]) and
+        int(full["updates"]) == int(resumed["updates"])):
+        print("The resumed run matches the full run.")
+    else:
+        print("The resumed run differs from the full run.")
+        sys.exit(1)
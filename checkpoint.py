@@ -0,0 +1,141 @@
+#
+# Checkpoints of an agent and its training run (train.py --checkpoint,
+# --resume and --evaluate).
+#
+# A checkpoint is a NumPy .npz file, a zip of binary arrays that is read
+# back without pickle. It holds the weights with the names of the features
+# they belong to, the agent's hyperparameters and update count, the state
+# of Python's and NumPy's random number generators, the number of episodes
+# played and doomUtils.counts. Checkpoints are written to a temporary file
+# next to the target and renamed over it, so a crash never leaves a
+# half-written checkpoint behind.
+#
+
+import os, random, tempfile
+import numpy as np
+import doomUtils
+
+# Bumped whenever what a checkpoint holds changes.
+FORMAT = 1
+
+
+"""
+# Function: save
+# --------------
+# Writes a checkpoint atomically.
+#
+# path:     where to write it
+# agent:    the agent, bound to an extractor
+# scenario: the scenario being played
+# episode:  how many episodes have been played
+#
+# returns: the size of the checkpoint in bytes
+"""
+def save(path, agent, scenario, episode):
+    randomState = random.getstate()
+    numpyState  = np.random.get_state()
+    countNames  = sorted(doomUtils.counts.keys())
+
+    arrays = {
+        "format":        np.array(FORMAT),
+        "scenario":      np.array(scenario),
+        "featureNames":  np.array(agent.extractor.featureNames),
+        "weights":       np.asarray(agent.weights, dtype=np.float64),
+        "updates":       np.array(agent.updates),
+        "epsilon":       np.array(agent.epsilon),
+        "gamma":         np.array(agent.gamma),
+        "alpha":         np.array(agent.alpha),
+        "episode":       np.array(episode),
+        "randomVersion": np.array(randomState[0]),
+        "randomKey":     np.array(randomState[1], dtype=np.uint64),
+        "randomGauss":   np.array(np.nan if randomState[2] is None else randomState[2]),
+        "numpyKey":      numpyState[1],
+        "numpyPos":      np.array(numpyState[2]),
+        "numpyHasGauss": np.array(numpyState[3]),
+        "numpyGauss":    np.array(numpyState[4]),
+        "countNames":    np.array(countNames, dtype=str),
+        "countValues":   np.array([doomUtils.counts[k] for k in countNames], dtype=np.int64),
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp  = tempfile.mkstemp(prefix=".checkpoint-", suffix=".npz", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        # os.replace also replaces an existing checkpoint on Windows.
+        getattr(os, "replace", os.rename)(temp, path)
+    except:
+        os.remove(temp)
+        raise
+    return os.path.getsize(path)
+
+
+"""
+# Function: load
+# --------------
+# Reads a checkpoint.
+#
+# returns: a dict of its arrays
+"""
+def load(path):
+    with np.load(path, allow_pickle=False) as f:
+        checkpoint = dict((name, f[name]) for name in f.files)
+    if int(checkpoint["format"]) != FORMAT:
+        raise ValueError("%s is a format %d checkpoint, expected format %d"
+                         % (path, int(checkpoint["format"]), FORMAT))
+    return checkpoint
+
+
+"""
+# Function: restoreAgent
+# ----------------------
+# Sets an agent's weights, hyperparameters and update count from a
+# checkpoint. Weights are matched to the agent's extractor by feature name:
+# features the checkpoint does not have start at 0, and the weights of
+# features the extractor no longer has are dropped.
+#
+# returns: the names of the features that started at 0
+"""
+def restoreAgent(checkpoint, agent):
+    weights = dict(zip(checkpoint["featureNames"].tolist(),
+                       checkpoint["weights"].tolist()))
+    missing = []
+    for name, i in agent.extractor.featureIndex.items():
+        if name in weights:
+            agent.weights[i] = weights[name]
+        else:
+            agent.weights[i] = 0.0
+            missing.append(name)
+
+    agent.updates  = int(checkpoint["updates"])
+    agent.epsilon  = float(checkpoint["epsilon"])
+    agent.gamma    = float(checkpoint["gamma"])
+    agent.alpha    = float(checkpoint["alpha"])
+    return missing
+
+
+"""
+# Function: restoreRun
+# --------------------
+# Restores the random number generators and doomUtils.counts from a
+# checkpoint, to carry on the run it was taken from.
+#
+# returns: the number of episodes played
+"""
+def restoreRun(checkpoint):
+    gauss = float(checkpoint["randomGauss"])
+    random.setstate((int(checkpoint["randomVersion"]),
+                     tuple(int(k) for k in checkpoint["randomKey"]),
+                     None if np.isnan(gauss) else gauss))
+    np.random.set_state(("MT19937", checkpoint["numpyKey"],
+                         int(checkpoint["numpyPos"]),
+                         int(checkpoint["numpyHasGauss"]),
+                         float(checkpoint["numpyGauss"])))
+
+    doomUtils.counts.clear()
+    for name, value in zip(checkpoint["countNames"].tolist(),
+                           checkpoint["countValues"].tolist()):
+        doomUtils.counts[name] = int(value)
+    return int(checkpoint["episode"])
@@ -0,0 +1,682 @@
+#
+# A pure Python stand-in for ViZDoom's DoomGame (train.py --simulator), so
+# the agent, perception and extractor code can run on machines without the
+# engine, its binary or the scenario wads.
+#
+# Every world is a square room seen from the marine's eyes: the marine, the
+# things in the room (medikits, poisons and monsters) and what the buttons
+# do are simulated a tic at a time in a few float operations, and the
+# labels and depth buffers are only rendered, with NumPy, when get_state is
+# called. Walls are ray cast per screen column, the floor and ceiling per
+# row, and things are drawn as flat sprites from the farthest to the
+# nearest, hidden behind walls column by column.
+#
+# The worlds are simplified versions of the scenarios, picked by the file
+# name of the config (and of the scenario wad, for health gathering
+# supreme), and only have what our extractors look at:
+#
+# basic:                    a Cacodemon on the far wall, shot by strafing
+#                           in front of it (MOVE_LEFT, MOVE_RIGHT, ATTACK)
+# health gathering:         medikits on an acid floor, picked up by turning
+#                           and walking (TURN_LEFT, TURN_RIGHT, MOVE_FORWARD)
+# health gathering supreme: fewer medikits, and poison
+# defend the center:        Demons and chainsaw marines closing in on the
+#                           marine in the middle (TURN_LEFT, TURN_RIGHT,
+#                           ATTACK)
+#
+# The screen buffer is not rendered: no feature reads it.
+#
+
+from __future__ import division
+
+import math, os, random
+import numpy as np
+
+__all__ = ["DoomGame", "GameState", "Label", "GameVariable",
+           "ScreenResolution", "ScreenFormat", "Mode", "DEFAULT_TICRATE"]
+
+# Tics per second of the engine, which train.py paces windowed runs with.
+DEFAULT_TICRATE = 35
+
+
+class EnumValue():
+    """
+    A value of one of the enums below. Values are told apart by name, so
+    the game also takes ViZDoom's own enums.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+"""
+# Function: enum
+# --------------
+# Makes a class with an EnumValue attribute per name.
+"""
+def enum(className, names):
+    return type(className, (), dict((name, EnumValue(name)) for name in names))
+
+
+GameVariable = enum("GameVariable", ["AMMO2", "ANGLE", "HEALTH", "KILLCOUNT",
+                                     "POSITION_X", "POSITION_Y", "POSITION_Z"])
+ScreenFormat = enum("ScreenFormat", ["CRCGCB", "RGB24", "RGBA32", "BGR24",
+                                     "GRAY8", "DOOM_256_COLORS8"])
+Mode         = enum("Mode", ["PLAYER", "SPECTATOR", "ASYNC_PLAYER",
+                             "ASYNC_SPECTATOR"])
+ScreenResolution = enum("ScreenResolution", [
+    "RES_%dX%d" % r for r in [(160, 120), (200, 150), (256, 192), (320, 180),
+                              (320, 200), (320, 240), (400, 300), (512, 384),
+                              (640, 360), (640, 400), (640, 480), (800, 600),
+                              (1024, 768), (1280, 960), (1600, 1200)]])
+
+
+"""
+# Function: nameOf
+# ----------------
+# The name of an enum value, ours or ViZDoom's.
+"""
+def nameOf(value):
+    return getattr(value, "name", str(value))
+
+
+# The marine and the room, in map units.
+EYE           = 41.0    # height of the marine's eyes
+CEILING       = 128.0   # height of the ceiling
+PLAYER_RADIUS = 16.0
+MOVE_SPEED    = 8.0     # map units walked or strafed per tic
+TURN_SPEED    = math.radians(7.0)
+REFIRE        = 14      # tics between two pistol shots
+
+# Map units per step of the 8 bit depth buffer; farther is clipped to 255.
+DEPTH_UNIT    = 4.0
+
+
+"""
+# Function: depthValues
+# ---------------------
+# Depth buffer values of distances in map units.
+"""
+def depthValues(distances):
+    return np.minimum(np.asarray(distances) / DEPTH_UNIT, 255).astype(np.uint8)
+
+
+class Thing():
+    """
+    Something standing on the floor of a world: a medikit, a poison vial
+    or a monster.
+    """
+    __slots__ = ["id", "name", "x", "y", "radius", "height", "speed",
+                 "damage", "cooldown"]
+
+    def __init__(self, id, name, x, y, radius, height):
+        self.id       = id
+        self.name     = name
+        self.x        = x
+        self.y        = y
+        self.radius   = radius
+        self.height   = height
+        self.speed    = 0.0
+        self.damage   = 0
+        self.cooldown = 0
+
+
+class World():
+    """
+    The marine and the things in a square room. Subclasses set the room,
+    place the things in start, decode the buttons in act and play a tic in
+    tic, which returns the tic's reward. finished is set once the marine
+    is dead or the episode timed out.
+    """
+    room      = (-512.0, -512.0, 512.0, 512.0)   # xmin, ymin, xmax, ymax
+    timeout   = 2100
+    variables = ["HEALTH"]                       # the config's game variables
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def reset(self):
+        self.x = self.y = self.z = 0.0
+        self.setAngle(0.0)
+        self.health   = 100
+        self.ammo     = 0
+        self.kills    = 0
+        self.time     = 0
+        self.cooldown = 0
+        self.dead     = False
+        self.finished = False
+        self.things   = []
+        self.nextId   = 1
+        self.start()
+
+    def setAngle(self, angle):
+        self.angle = angle % (2 * math.pi)
+        self.cos   = math.cos(self.angle)
+        self.sin   = math.sin(self.angle)
+
+    def spawn(self, name, x, y, radius, height):
+        thing = Thing(self.nextId, name, x, y, radius, height)
+        self.nextId += 1
+        self.things.append(thing)
+        return thing
+
+    def randomSpot(self, margin):
+        """
+        Returns a random (x, y) in the room, at least margin from the walls
+        and from the marine.
+        """
+        xmin, ymin, xmax, ymax = self.room
+        while True:
+            x = self.rng.uniform(xmin + margin, xmax - margin)
+            y = self.rng.uniform(ymin + margin, ymax - margin)
+            if (x - self.x) ** 2 + (y - self.y) ** 2 > margin * margin:
+                return x, y
+
+    def clampToRoom(self):
+        xmin, ymin, xmax, ymax = self.room
+        self.x = min(max(self.x, xmin + PLAYER_RADIUS), xmax - PLAYER_RADIUS)
+        self.y = min(max(self.y, ymin + PLAYER_RADIUS), ymax - PLAYER_RADIUS)
+
+    def endTic(self):
+        if self.health <= 0:
+            self.dead = True
+        if self.dead or self.time >= self.timeout:
+            self.finished = True
+
+    def start(self):
+        pass
+
+    def act(self, action):
+        pass
+
+    def tic(self):
+        self.time += 1
+        self.endTic()
+        return 0.0
+
+
+class BasicWorld(World):
+    """
+    A Cacodemon at a random spot on the far wall. Every tic costs 1, every
+    missed shot 5, and killing it (one shot) gives 101 and ends the
+    episode.
+    """
+    room      = (-64.0, -192.0, 384.0, 192.0)
+    timeout   = 300
+    variables = ["AMMO2"]
+
+    def start(self):
+        self.ammo    = 50
+        self.monster = self.spawn("Cacodemon", 320.0,
+                                  self.rng.uniform(-160.0, 160.0), 31.0, 56.0)
+
+    def act(self, action):
+        self.strafe = (bool(action[0]) - bool(action[1])) * MOVE_SPEED
+        self.fire   = bool(action[2])
+
+    def tic(self):
+        self.time += 1
+        reward = -1.0
+        if self.strafe:
+            self.y = min(max(self.y + self.strafe, -176.0), 176.0)
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+        elif self.fire and self.ammo > 0:
+            self.ammo    -= 1
+            self.cooldown = REFIRE
+            if abs(self.monster.y - self.y) < self.monster.radius:
+                self.things = []
+                self.kills += 1
+                self.finished = True
+                return reward + 101.0
+            reward -= 5.0
+
+        self.endTic()
+        return reward
+
+
+class HealthWorld(World):
+    """
+    Medikits on an acid floor taking 5 health every 32 tics. Every tic
+    alive gives 1 and dying costs 100. A medikit walked over gives 25
+    health, and another one appears somewhere else.
+    """
+    variables = ["HEALTH"]
+    medikits  = 10
+    poisons   = 0
+
+    def start(self):
+        self.setAngle(self.rng.uniform(0.0, 2 * math.pi))
+        for i in range(self.medikits):
+            self.spawn("CustomMedikit", *self.randomSpot(64.0), radius=20.0, height=16.0)
+        for i in range(self.poisons):
+            self.spawn("Poison", *self.randomSpot(64.0), radius=20.0, height=16.0)
+
+    def act(self, action):
+        self.turn    = (bool(action[0]) - bool(action[1])) * TURN_SPEED
+        self.forward = bool(action[2])
+
+    def pickUp(self, thing):
+        if thing.name == "Poison":
+            self.health -= 25
+        else:
+            self.health = min(self.health + 25, 100)
+        thing.x, thing.y = self.randomSpot(64.0)
+
+    def tic(self):
+        self.time += 1
+        reward = 1.0
+        if self.turn:
+            self.setAngle(self.angle + self.turn)
+        if self.forward:
+            self.x += self.cos * MOVE_SPEED
+            self.y += self.sin * MOVE_SPEED
+            self.clampToRoom()
+            x, y = self.x, self.y
+            for thing in self.things:
+                reach = PLAYER_RADIUS + thing.radius
+                if (thing.x - x) ** 2 + (thing.y - y) ** 2 < reach * reach:
+                    self.pickUp(thing)
+
+        if self.time % 32 == 0:
+            self.health -= 5
+        self.endTic()
+        if self.dead:
+            reward -= 100.0
+        return reward
+
+
+class SupremeWorld(HealthWorld):
+    """
+    Health gathering with fewer medikits, and poison vials taking 25
+    health.
+    """
+    medikits = 5
+    poisons  = 5
+
+
+class CenterWorld(World):
+    """
+    The marine stands in the middle of the room and only turns. Demons and
+    chainsaw marines walk in from the walls and bite or saw once they are
+    close. Every kill (one shot) gives 1 and a new monster at the wall,
+    dying costs 1. There are 26 bullets.
+    """
+    variables = ["AMMO2", "HEALTH"]
+    monsters  = {"Demon":          (30.0, 56.0, 3.0, 8),   # radius, height,
+                 "MarineChainsaw": (16.0, 56.0, 2.0, 6)}   # speed, damage
+    numMonsters = 5
+    spawnRadius = 448.0
+    meleeRange  = 64.0
+
+    def start(self):
+        self.ammo = 26
+        for i in range(self.numMonsters):
+            self.spawnMonster()
+
+    def spawnMonster(self):
+        name   = self.rng.choice(sorted(self.monsters.keys()))
+        radius, height, speed, damage = self.monsters[name]
+        angle  = self.rng.uniform(0.0, 2 * math.pi)
+        thing  = self.spawn(name, self.spawnRadius * math.cos(angle),
+                            self.spawnRadius * math.sin(angle), radius, height)
+        thing.speed, thing.damage = speed, damage
+
+    def act(self, action):
+        self.turn = (bool(action[0]) - bool(action[1])) * TURN_SPEED
+        self.fire = bool(action[2])
+
+    def shoot(self):
+        """
+        Kills the nearest monster in the line of fire, if any.
+
+        returns: the reward for the shot
+        """
+        target, nearest = None, float("inf")
+        for thing in self.things:
+            distance = math.hypot(thing.x, thing.y)
+            offset   = math.atan2(thing.y, thing.x) - self.angle
+            offset   = (offset + math.pi) % (2 * math.pi) - math.pi
+            if abs(offset) < math.atan2(thing.radius, distance) and distance < nearest:
+                target, nearest = thing, distance
+        if target is None:
+            return 0.0
+        self.things.remove(target)
+        self.kills += 1
+        self.spawnMonster()
+        return 1.0
+
+    def tic(self):
+        self.time += 1
+        reward = 0.0
+        if self.turn:
+            self.setAngle(self.angle + self.turn)
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+        elif self.fire and self.ammo > 0:
+            self.ammo    -= 1
+            self.cooldown = REFIRE
+            reward += self.shoot()
+
+        # The marine stays at the origin, so a monster walks straight in.
+        for thing in self.things:
+            distance = math.hypot(thing.x, thing.y)
+            if distance > self.meleeRange:
+                step = thing.speed / distance
+                thing.x -= thing.x * step
+                thing.y -= thing.y * step
+            elif thing.cooldown > 0:
+                thing.cooldown -= 1
+            else:
+                self.health  -= thing.damage
+                thing.cooldown = 20
+
+        self.endTic()
+        if self.dead:
+            reward -= 1.0
+        return reward
+
+
+# The world of every config file, and of the scenario wads replacing a
+# config's world.
+worlds = {
+    "basic.cfg":             BasicWorld,
+    "health_gathering.cfg":  HealthWorld,
+    "defend_the_center.cfg": CenterWorld,
+}
+scenarioWorlds = {
+    "health_gathering_supreme.wad": SupremeWorld,
+}
+
+"""
+# Function: supports
+# ------------------
+# Whether there is a world for a config file and scenario wad (or None).
+"""
+def supports(config, wad=None):
+    if wad is not None:
+        return os.path.basename(wad) in scenarioWorlds
+    return os.path.basename(config) in worlds
+
+
+# How every game variable is read off a world.
+gameVariables = {
+    "AMMO2":      lambda w: w.ammo,
+    "ANGLE":      lambda w: math.degrees(w.angle),
+    "HEALTH":     lambda w: w.health,
+    "KILLCOUNT":  lambda w: w.kills,
+    "POSITION_X": lambda w: w.x,
+    "POSITION_Y": lambda w: w.y,
+    "POSITION_Z": lambda w: w.z,
+}
+
+
+class Label():
+    """
+    A thing on screen, with the attributes of a ViZDoom label.
+    """
+    def __init__(self, value, thing):
+        self.value             = value
+        self.object_id         = thing.id
+        self.object_name       = thing.name
+        self.object_position_x = thing.x
+        self.object_position_y = thing.y
+        self.object_position_z = 0.0
+
+
+class GameState():
+    """
+    The state of a tic, with the attributes of a ViZDoom game state.
+    Disabled buffers are None.
+    """
+    def __init__(self, number, tic, game_variables, labels_buffer,
+                 depth_buffer, labels):
+        self.number         = number
+        self.tic            = tic
+        self.game_variables = game_variables
+        self.screen_buffer  = None
+        self.depth_buffer   = depth_buffer
+        self.labels_buffer  = labels_buffer
+        self.automap_buffer = None
+        self.labels         = labels
+
+
+class DoomGame():
+    """
+    The subset of ViZDoom's DoomGame the scripts use, playing one of the
+    worlds above. Configure it like a DoomGame, then init starts the first
+    episode. Setters for what is not simulated (sound, window, rendering
+    options, see ignoredSetters) are accepted and ignored.
+    """
+    def __init__(self):
+        self.worldType     = None
+        self.world         = None
+        self.width         = 320
+        self.height        = 240
+        self.depthEnabled  = False
+        self.labelsEnabled = False
+        self.variables     = None
+        self.rng           = random.Random()
+        self.number        = 0
+        self.state         = None
+        self.lastAction    = None
+        self.totalReward   = 0.0
+
+    def load_config(self, path):
+        name = os.path.basename(path)
+        if not name in worlds:
+            raise ValueError("doomSim has no world for %s, only for %s"
+                             % (name, ", ".join(sorted(worlds.keys()))))
+        self.worldType = worlds[name]
+
+    def set_doom_scenario_path(self, path):
+        name = os.path.basename(path)
+        if not name in scenarioWorlds:
+            raise ValueError("doomSim has no world for %s, only for %s"
+                             % (name, ", ".join(sorted(scenarioWorlds.keys()))))
+        self.worldType = scenarioWorlds[name]
+
+    def set_screen_resolution(self, resolution):
+        self.width, self.height = [int(n) for n in
+                                   nameOf(resolution).split("_")[-1].split("X")]
+
+    def set_depth_buffer_enabled(self, enabled):
+        self.depthEnabled = bool(enabled)
+
+    def set_labels_buffer_enabled(self, enabled):
+        self.labelsEnabled = bool(enabled)
+
+    def clear_available_game_variables(self):
+        self.variables = []
+
+    def add_available_game_variable(self, variable):
+        if self.variables is None:
+            self.variables = []
+        self.variables.append(nameOf(variable))
+
+    def get_available_game_variables(self):
+        if self.variables is None:
+            names = self.worldType.variables if self.worldType is not None else []
+        else:
+            names = self.variables
+        return [getattr(GameVariable, name) for name in names]
+
+    def set_seed(self, seed):
+        self.rng.seed(seed)
+
+    def init(self):
+        if self.worldType is None:
+            raise RuntimeError("load_config must be called before init")
+        self.world = self.worldType(self.rng)
+        if self.variables is None:
+            self.variables = list(self.world.variables)
+        for name in self.variables:
+            if not name in gameVariables:
+                raise ValueError("doomSim does not simulate %s" % name)
+
+        # What the renderer needs per column and per row of the screen: the
+        # sideways slope of every column's ray, one map unit ahead, and the
+        # distance to the floor or ceiling seen in every row.
+        self.focal   = self.width / 2.0
+        self.slopes  = (self.width / 2.0 - np.arange(self.width) - 0.5) / self.focal
+        rows         = np.arange(self.height) - self.height / 2.0 + 0.5
+        self.planes  = depthValues(np.where(rows > 0, EYE, CEILING - EYE) *
+                                   self.focal / np.abs(rows))
+        self.new_episode()
+
+    def close(self):
+        self.world = None
+
+    def new_episode(self):
+        self.world.reset()
+        self.number     += 1
+        self.state       = None
+        self.lastAction  = None
+        self.totalReward = 0.0
+
+    def is_episode_finished(self):
+        return self.world.finished
+
+    def is_player_dead(self):
+        return self.world.dead
+
+    def get_available_buttons_size(self):
+        return 3
+
+    def get_screen_width(self):
+        return self.width
+
+    def get_screen_height(self):
+        return self.height
+
+    def get_episode_time(self):
+        return self.world.time
+
+    def get_total_reward(self):
+        return self.totalReward
+
+    def get_last_action(self):
+        return self.lastAction
+
+    def get_game_variable(self, variable):
+        return float(gameVariables[nameOf(variable)](self.world))
+
+    def make_action(self, action, tics=1):
+        """
+        Holds the action for a number of tics, or until the episode
+        finishes.
+
+        returns: the sum of the rewards
+        """
+        world  = self.world
+        reward = 0.0
+        if world.finished:
+            return reward
+
+        world.act(action)
+        for i in range(tics):
+            reward += world.tic()
+            self.number += 1
+            if world.finished:
+                break
+
+        self.lastAction   = list(action)
+        self.totalReward += reward
+        return reward
+
+    def get_state(self):
+        """
+        Returns the GameState of the current tic, rendering its buffers
+        the first time, or None once the episode has finished.
+        """
+        if self.world.finished:
+            return None
+        if self.state is None or self.state.number != self.number:
+            variables = np.array([gameVariables[name](self.world)
+                                  for name in self.variables], dtype=np.float64)
+            labels_buffer = depth_buffer = None
+            labels = []
+            if self.labelsEnabled or self.depthEnabled:
+                labels_buffer, depth_buffer, labels = self.render()
+            self.state = GameState(self.number, self.world.time, variables,
+                                   labels_buffer if self.labelsEnabled else None,
+                                   depth_buffer if self.depthEnabled else None,
+                                   labels if self.labelsEnabled else [])
+        return self.state
+
+    def render(self):
+        """
+        Renders the labels and depth buffers of the world seen by the
+        marine.
+
+        returns: (labels buffer, depth buffer, labels of the things drawn)
+        """
+        world = self.world
+        x, y, cos, sin = world.x, world.y, world.cos, world.sin
+        xmin, ymin, xmax, ymax = world.room
+
+        # The ray of every column moves one unit forward per unit of t, so
+        # the t it hits a wall at is the wall's depth.
+        dx = cos - self.slopes * sin
+        dy = sin + self.slopes * cos
+        with np.errstate(divide="ignore"):
+            tx = np.where(dx > 0, xmax - x, xmin - x) / dx
+            ty = np.where(dy > 0, ymax - y, ymin - y) / dy
+        walls = np.minimum(np.where(dx == 0, np.inf, tx), np.where(dy == 0, np.inf, ty))
+
+        depth_buffer  = np.minimum(self.planes[:, np.newaxis],
+                                   depthValues(walls)[np.newaxis, :])
+        labels_buffer = np.zeros((self.height, self.width), dtype=np.uint8)
+
+        # Things in front of the marine, as screen rectangles and the
+        # columns where no wall is in front of them.
+        sprites = []
+        for thing in world.things:
+            forward = (thing.x - x) * cos + (thing.y - y) * sin
+            if forward < 1.0:
+                continue
+            side   = (thing.y - y) * cos - (thing.x - x) * sin
+            scale  = self.focal / forward
+            center = self.width / 2.0 - side * scale
+            left   = max(int(center - thing.radius * scale), 0)
+            right  = min(int(center + thing.radius * scale) + 1, self.width)
+            if left >= right:
+                continue
+            visible = forward < walls[left:right]
+            if not visible.any():
+                continue
+            top    = max(int(self.height / 2.0 - (thing.height - EYE) * scale), 0)
+            bottom = min(int(self.height / 2.0 + EYE * scale) + 1, self.height)
+            sprites.append((forward, thing, left, right, top, bottom, visible))
+
+        labels = []
+        for forward, thing, left, right, top, bottom, visible in sorted(
+                sprites, key=lambda s: -s[0]):
+            value = len(labels) + 1
+            labels_buffer[top:bottom, left:right][:, visible] = value
+            depth_buffer[top:bottom, left:right][:, visible] = depthValues(forward)
+            labels.append(Label(value, thing))
+
+        return labels_buffer, depth_buffer, labels
+
+
+# The DoomGame setters of what the simulator does not simulate. Any other
+# setter it has no method for fails like a missing method does.
+ignoredSetters = [
+    "set_mode", "set_automap_buffer_enabled", "set_window_visible",
+    "set_sound_enabled", "set_screen_format", "set_render_hud",
+    "set_render_minimal_hud", "set_render_crosshair", "set_render_weapon",
+    "set_render_decals", "set_render_particles", "set_render_effects_sprites",
+    "set_render_messages", "set_render_screen_flashes",
+]
+
+
+def ignoreSetting(self, *args):
+    pass
+
+for name in ignoredSetters:
+    setattr(DoomGame, name, ignoreSetting)
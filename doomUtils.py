@@ -5,9 +5,28 @@
 #
 
 
-from vizdoom import *
-import itertools as it
-import math
+try:
+    from vizdoom import *
+except ImportError:
+    # Without ViZDoom, the names come from its stand-in (train.py --simulator).
+    from doomSim import *
+import math, threading, time, timeit
+from collections import Counter
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+# Running totals of the work done by the step loop: engine ticks played,
+# observations made with getGameState and Perceptions built.
+counts = Counter()
+
+# Seconds spent in each stage of the pipelined step loop, see
+# playEpisodePipelined.
+timings = Counter()
 
 
 """
@@ -73,60 +92,320 @@ def objectDistances(game_state, my_pos):
     return distances
 
 
+"""
+# Function: labelBoundingBoxes
+# ----------------------------
+# Finds the bounding box of every given label value in the labels buffer
+# in a single pass over the buffer, whatever the number of labels: every
+# row is split into runs of one label value, and the runs (a few per object
+# per row, far fewer than pixels) are reduced by label value.
+#
+# labels_buf: the labels buffer of a ViZDoom game state (height x width)
+# values:     the label values to look for (game_state.labels values)
+#
+# returns: A dictionary of label value -> (left, right, top, bottom, area).
+#          Values with no pixels in the buffer are left out.
+"""
+def labelBoundingBoxes(labels_buf, values):
+    buf = np.asarray(labels_buf)
+    if buf.size == 0:
+        return {}
+    height, width = buf.shape
+
+    # A run starts at the first pixel of every row and wherever the value
+    # changes, and ends where the next one starts.
+    change = np.empty((height, width), dtype=bool)
+    change[:, 0] = True
+    np.not_equal(buf[:, 1:], buf[:, :-1], out=change[:, 1:])
+    starts = np.flatnonzero(change)
+    ends   = np.append(starts[1:], height * width)
+    labels = buf.ravel()[starts]
+
+    labelled = labels != 0
+    starts, ends, labels = starts[labelled], ends[labelled], labels[labelled].astype(np.intp)
+    rows, firstCols = np.divmod(starts, width)
+    lastCols = ends - 1 - rows * width
+
+    size   = max(256, int(labels.max()) + 1 if len(labels) else 0)
+    area   = np.bincount(labels, weights=ends - starts, minlength=size)
+    left   = np.full(size, width, dtype=np.intp)
+    right  = np.full(size, -1, dtype=np.intp)
+    top    = np.full(size, height, dtype=np.intp)
+    bottom = np.full(size, -1, dtype=np.intp)
+    np.minimum.at(left, labels, firstCols)
+    np.maximum.at(right, labels, lastCols)
+    np.minimum.at(top, labels, rows)
+    np.maximum.at(bottom, labels, rows)
+
+    boxes = {}
+    for value in values:
+        if 0 < value < size and area[value] > 0:
+            boxes[value] = (int(left[value]), int(right[value]),  # left, right pixel
+                            int(top[value]), int(bottom[value]),  # top, bottom pixel
+                            int(area[value]))                     # pixel area
+
+    return boxes
+
+
+"""
+# Class: Perception
+# -----------------
+# Everything the extractors need to know about a single frame, built in one
+# pass over game_state.labels: label metadata, object coordinates, and the
+# objects on screen with their distances to the marine. Distances are only
+# computed for objects that are actually on screen.
+#
+# Perceptions are memoized on game_state.number by getPerception, so asking
+# for the same frame twice never walks the labels again.
+"""
+class Perception():
+    def __init__(self, game_state, resolution, my_pos):
+        self.game_state  = game_state
+        self.resolution  = resolution
+        self.my_pos      = my_pos
+        self.labels      = {}    # label value -> (object id, object name)
+        self.coordinates = {}    # label value -> [x, y, z]
+        self.distances   = {}    # label value -> distance, on screen only
+        self.cache       = {}    # per-frame results computed by the extractors
+        self.number      = None
+
+        # There is no game state once the episode has finished.
+        if game_state is not None:
+            self.number = game_state.number
+            for l in game_state.labels:
+                self.labels[l.value]      = (l.object_id, l.object_name)
+                self.coordinates[l.value] = [l.object_position_x,
+                                             l.object_position_y,
+                                             l.object_position_z]
+
+        self.objects = extractObjects(self)
+
+    def depthSectors(self, regions):
+        """
+        Returns the DepthSectors of this frame's depth buffer for the given
+        ScreenRegions, computing them only once per frame.
+        """
+        key = ("depth sectors", regions.width, tuple(regions.bounds))
+        if not key in self.cache:
+            self.cache[key] = DepthSectors(self.game_state.depth_buffer, regions)
+        return self.cache[key]
+
+
+# The most recently built perception, see getPerception.
+lastPerception = None
+
+"""
+# Function: getPerception
+# -----------------------
+# Returns the perception of a frame, building it only if the frame differs
+# from the last one seen (memoized on game_state.number).
+#
+# game_state: a ViZDoom game state (game.get_state())
+# resolution: a tuple of the resolution (width, height)
+# my_pos:     The position of the marine as a tuple (X, Y, Z)
+#
+# returns: A Perception of the frame.
+"""
+def getPerception(game_state, resolution, my_pos):
+    global lastPerception
+
+    number = None if game_state is None else game_state.number
+    if (lastPerception is None or number is None or
+        lastPerception.number != number):
+        lastPerception = Perception(game_state, resolution, my_pos)
+        counts["perceptions"] += 1
+
+    return lastPerception
+
+
+# Sectors of the three way split made by crosshairRegions.
+LEFT, CENTER, RIGHT = 0, 1, 2
+
+"""
+# Class: ScreenRegions
+# --------------------
+# Splits the screen into horizontal sectors in integer pixel space. The
+# sector of every pixel column is precomputed, so classifying an object is
+# a single table lookup. An object is placed in the sector of its column
+# nearest the crosshair (the center column of the screen), so an object
+# under the crosshair is always in the crosshair's sector.
+#
+# width:  the width of the screen in pixels
+# bounds: the first column of every sector but the first, in increasing order
+"""
+class ScreenRegions():
+    def __init__(self, width, bounds):
+        self.width    = width
+        self.bounds   = list(bounds)
+        self.sectors  = len(self.bounds) + 1
+        self.center   = width // 2
+        self.sectorOf = np.searchsorted(self.bounds, np.arange(width),
+                                        side='right')
+
+    def classify(self, left, right):
+        """
+        Returns the sector of an object spanning columns left to right.
+        """
+        column = min(max(self.center, left), right)
+        return int(self.sectorOf[column])
+
+    def classifyAll(self, lefts, rights):
+        """
+        Returns an array with the sector of every object, given arrays of
+        their leftmost and rightmost columns.
+        """
+        columns = np.minimum(np.maximum(self.center, np.asarray(lefts, dtype=int)),
+                             np.asarray(rights, dtype=int))
+        return self.sectorOf[columns]
+
+
+# ScreenRegions already built, keyed by (width, bounds).
+screenRegions = {}
+
+"""
+# Function: getScreenRegions
+# --------------------------
+# Returns the ScreenRegions for a screen width and sector bounds, building
+# them only the first time they're asked for.
+"""
+def getScreenRegions(width, bounds):
+    key = (width, tuple(bounds))
+    if not key in screenRegions:
+        screenRegions[key] = ScreenRegions(width, bounds)
+    return screenRegions[key]
+
+"""
+# Function: crosshairRegions
+# --------------------------
+# The three sectors the extractors use: LEFT of the crosshair, the CENTER
+# column under the crosshair, and RIGHT of the crosshair.
+"""
+def crosshairRegions(width):
+    center = width // 2
+    return getScreenRegions(width, [center, center + 1])
+
+"""
+# Function: evenRegions
+# ---------------------
+# Splits the screen into n sectors of (nearly) equal width.
+"""
+def evenRegions(width, n):
+    return getScreenRegions(width, [width * i // n for i in range(1, n)])
+
+"""
+# Function: edgeRegions
+# ---------------------
+# Three sectors: the leftmost column, everything in between, and the
+# rightmost column. The health extractors judge open sides and walls by the
+# depth of the edge columns.
+"""
+def edgeRegions(width):
+    return getScreenRegions(width, [1, width - 1])
+
+
+"""
+# Class: DepthSectors
+# -------------------
+# Depth statistics for the sectors of a ScreenRegions split, computed with
+# NumPy on demand, over the columns of the sectors asked for only: the
+# health extractors only look at the one column wide edge sectors of
+# edgeRegions. Larger depths are farther away, i.e. more free space.
+#
+# mean(sector): the mean depth of a sector
+# min(sector):  the smallest depth of a sector (the closest obstacle)
+# percentile(q): the q-th percentile depth of every sector, computed on
+#                demand: (100 - q)% of the sector has at least that much
+#                free space in front of it. 8 bit depth buffers (what
+#                ViZDoom gives us) use one histogram per sector, taking the
+#                lowest depth reaching q% of the sector.
+#
+# Sectors are indexed like lists, -1 being the rightmost one.
+"""
+class DepthSectors():
+    def __init__(self, depth_buf, regions):
+        self.depth_buf = np.asarray(depth_buf)
+        self.regions   = regions
+        self.starts    = [0] + regions.bounds
+        self.ends      = regions.bounds + [regions.width]
+
+        self.means       = {}
+        self.mins        = {}
+        self.percentiles = {}
+
+    def columns(self, sector):
+        """
+        Returns the depth buffer columns of a sector, as a view.
+        """
+        return self.depth_buf[:, self.starts[sector]:self.ends[sector]]
+
+    def mean(self, sector):
+        sector %= len(self.starts)
+        if not sector in self.means:
+            columns = self.columns(sector)
+            self.means[sector] = columns.sum(dtype=np.uint64) / float(columns.size)
+        return self.means[sector]
+
+    def min(self, sector):
+        sector %= len(self.starts)
+        if not sector in self.mins:
+            self.mins[sector] = self.columns(sector).min()
+        return self.mins[sector]
+
+    def percentile(self, q):
+        if q in self.percentiles:
+            return self.percentiles[q]
+
+        if self.depth_buf.dtype == np.uint8:
+            sectors = self.regions.sectors
+            keys    = (self.regions.sectorOf * 256)[np.newaxis, :] + self.depth_buf
+            counts  = np.bincount(keys.ravel(), minlength=sectors * 256)
+            counts  = counts.reshape(sectors, 256).cumsum(axis=1)
+            self.percentiles[q] = (counts < counts[:, -1:] * (q / 100.0)).sum(axis=1)
+        else:
+            self.percentiles[q] = np.array(
+                [np.percentile(self.columns(sector), q)
+                 for sector in range(len(self.starts))])
+
+        return self.percentiles[q]
+
+
 """
 # Function: extractObjects
 # ------------------------
 # Examines the labels buffer and extracts all objects from it. Objects are
 # stored in a dictionary in the form [leftmost pixel of object,
 #                                     rightmost pixel of object,
-#                                     object coordinates]
+#                                     object coordinates,
+#                                     object distance,
+#                                     object id,
+#                                     object name]
 #
-# game_state: a ViZDoom game state (game.get_state())
-# resolution: a tuple of the resolution (width, height)
+# perception: the Perception of the frame; its labels and coordinates must
+#             already be filled in. Distances of the objects found are
+#             stored in perception.distances.
 #
 # returns: A dictionary containing all objects on the screen.
 """
-def extractObjects(game_state, resolution, my_pos):
-    screen_width, screen_height = resolution
-    distances   = objectDistances(game_state, my_pos)
-    coordinates = objectCoordinates(game_state)    
-    labels_buf  = game_state.labels_buffer
+def extractObjects(perception):
+    game_state = perception.game_state
+    labels     = perception.labels
+    objects    = {}
 
-    labels  = {}
-    objects = {}
-    
-    for l in game_state.labels:
-        labels[l.value] = (l.object_id, l.object_name)
-        
-    if labels_buf == None:
+    if game_state is None or game_state.labels_buffer is None:
         return objects
-    else:
-        # Examine every cell of the buffer.
-        for row in range(0, screen_height, 4):
-            for col in range(0, screen_width, 4):
-                value = labels_buf[row][col]
-                # If it has a value other than 0 (0 == No object seen)
-                if not (value == 0):
-
-                    # If the object isn't in the dictionary, add it.
-                    if not value in list(objects.keys()):
-                        objects[value] = [col, col,            #left, right pixel
-                                          coordinates[value],  # object coordinates
-                                          distances[value],    # object distance
-                                          labels[value][0],    # object id
-                                          labels[value][1]]    # object name
-
-                    # Otherwise, update the left or right most pixel location.
-                    else:
-                        left, right, coords, dist, obj_id, obj_name = objects[value]
-                        if col < left:
-                            objects[value] = [col, right, coords,
-                                              dist, obj_id, obj_name]
-                        elif col > right:
-                            objects[value] = [left, col, coords,
-                                              dist, obj_id, obj_name]
 
-        return objects
+    boxes = labelBoundingBoxes(game_state.labels_buffer, list(labels.keys()))
+    for value in boxes:
+        left, right, top, bottom, area = boxes[value]
+        coords = perception.coordinates[value]
+        perception.distances[value] = distance(coords, perception.my_pos)
+        objects[value] = [left, right,                  # left, right pixel
+                          coords,                       # object coordinates
+                          perception.distances[value],  # object distance
+                          labels[value][0],             # object id
+                          labels[value][1]]             # object name
+
+    return objects
 
 
 """
@@ -139,9 +418,10 @@ def extractObjects(game_state, resolution, my_pos):
 # all_actions: a list of all possible actions the marine can take.
 # 
 # returns: The state of the game in tuple form, consisting of the game state
-#          information returned from ViZDoom's get_state(), all objects on
-#          screen, a list of possible actions, the resolution, the game
-#          variables, if you're in a terminal state, and the game scenario.
+#          information returned from ViZDoom's get_state(), the Perception
+#          of the frame (perception.objects holds all objects on screen),
+#          a list of possible actions, the last action, the resolution,
+#          if you're in a terminal state, and the game scenario.
 """
 def getGameState(game, scenario, all_actions):
     gs = game.get_state()
@@ -152,11 +432,199 @@ def getGameState(game, scenario, all_actions):
               game.get_game_variable(GameVariable.POSITION_Z))
 
     prev = game.get_last_action()
+
+    counts["observations"] += 1
     
     return (gs,                             #ViZDoom game state
-            extractObjects(gs, resolution, my_pos), #Dictionary of visible objects
+            getPerception(gs, resolution, my_pos), #Perception of the frame
             all_actions,                    #All possible actions
             prev,                           #Last action performed
             resolution,                     #Resolution of the game screen
             game.is_episode_finished(),     #Terminal state?
             scenario)                       #The game scenario
+
+
+"""
+# Function: playEpisode
+# ---------------------
+# Plays one episode with an agent: the step loop shared by the scenario
+# scripts. The observation made after each action is carried forward as the
+# state of the next step, so the game is only observed once per decision.
+#
+# With a skiprate of k, every chosen action is held for k tics (the engine
+# repeats it and sums the rewards), and perception, action selection and
+# learning only happen on these decision frames. counts["decisions"],
+# counts["ticks"] and counts["observations"] keep track of this.
+#
+# game:        a ViZDoom game object, with a new episode started
+# agent:       the agent choosing actions and learning from transitions
+# scenario:    The game scenario as a string.
+# all_actions: a list of all possible actions the marine can take.
+# sleep_time:  seconds to pause after every action (0 to not pause)
+# onStep:      optional function called as onStep(state, action, reward)
+#              after every action
+# skiprate:    the number of tics every action is held for
+#
+# returns: the number of engine ticks played.
+"""
+def playEpisode(game, agent, scenario, all_actions, sleep_time=0, onStep=None,
+                skiprate=1):
+    start = game.get_episode_time()
+    state = getGameState(game, scenario, all_actions)
+
+    while not game.is_episode_finished():
+        action    = agent.getAction(state)
+
+        reward    = game.make_action(action, skiprate)
+
+        nextState = getGameState(game, scenario, all_actions)
+
+        agent.update(state, action, nextState, reward)
+
+        if onStep is not None:
+            onStep(state, action, reward)
+
+        state = nextState
+        counts["decisions"] += 1
+
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+    # The last action may have been cut short by the end of the episode.
+    ticks = game.get_episode_time() - start
+    counts["ticks"] += ticks
+
+    return ticks
+
+
+"""
+# Class: UpdateWorker
+# -------------------
+# A background thread running agent.update on the transitions put to it, in
+# order. Its queue holds at most staleness transitions. An exception raised
+# by update is raised again in the step loop, by wait or finish.
+"""
+class UpdateWorker(threading.Thread):
+    def __init__(self, agent, staleness):
+        threading.Thread.__init__(self)
+        self.daemon      = True
+        self.agent       = agent
+        self.transitions = queue.Queue(maxsize=staleness)
+        self.done        = threading.Condition()
+        self.pending     = 0
+        self.error       = None
+        self.start()
+
+    def run(self):
+        while True:
+            transition = self.transitions.get()
+            if transition is None:
+                return
+
+            start = timeit.default_timer()
+            try:
+                if self.error is None:
+                    self.agent.update(*transition)
+            except Exception as e:
+                self.error = e
+            timings["update"] += timeit.default_timer() - start
+
+            with self.done:
+                self.pending -= 1
+                self.done.notify()
+
+    def put(self, transition):
+        with self.done:
+            self.pending += 1
+        self.transitions.put(transition)
+
+    def wait(self, most):
+        """
+        Blocks until at most most transitions are waiting or being learned
+        from.
+        """
+        with self.done:
+            while self.pending > most:
+                self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+    def finish(self):
+        """
+        Blocks until every transition is learned from, and stops the thread.
+        """
+        self.transitions.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+"""
+# Function: playEpisodePipelined
+# ------------------------------
+# Plays one episode like playEpisode, but learns from every transition on
+# an UpdateWorker thread while the engine plays the next action. The engine
+# releases the GIL while it renders, so the update overlaps with it.
+#
+# The action for the next state is chosen before the update of the
+# transition into it is done, so actions are chosen with weights missing
+# up to staleness of the latest updates. A staleness of 0 plays the episode
+# with playEpisode.
+#
+# The seconds spent in every stage are added to timings: "engine"
+# (make_action), "perception" (getGameState), "action" (getAction) and
+# "stalled" (waiting for the update thread) in the step loop, and "update"
+# on the update thread.
+#
+# staleness: how many updates the weights choosing an action may miss
+#
+# returns: the number of engine ticks played.
+"""
+def playEpisodePipelined(game, agent, scenario, all_actions, sleep_time=0,
+                         onStep=None, skiprate=1, staleness=1):
+    if staleness < 1:
+        return playEpisode(game, agent, scenario, all_actions, sleep_time,
+                           onStep, skiprate)
+
+    timer  = timeit.default_timer
+    worker = UpdateWorker(agent, staleness)
+
+    start  = game.get_episode_time()
+    state  = getGameState(game, scenario, all_actions)
+    action = agent.getAction(state)
+
+    while not game.is_episode_finished():
+        t0 = timer()
+        reward    = game.make_action(action, skiprate)
+        t1 = timer()
+        nextState = getGameState(game, scenario, all_actions)
+        t2 = timer()
+        worker.wait(staleness - 1)
+        t3 = timer()
+        nextAction = agent.getAction(nextState)
+        t4 = timer()
+
+        worker.put((state, action, nextState, reward))
+
+        timings["engine"]     += t1 - t0
+        timings["perception"] += t2 - t1
+        timings["stalled"]    += t3 - t2
+        timings["action"]     += t4 - t3
+
+        if onStep is not None:
+            onStep(state, action, reward)
+
+        state  = nextState
+        action = nextAction
+        counts["decisions"] += 1
+
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+    worker.finish()
+
+    # The last action may have been cut short by the end of the episode.
+    ticks = game.get_episode_time() - start
+    counts["ticks"] += ticks
+
+    return ticks
@@ -5,148 +5,381 @@
 #
 # Feature extractors for an approximate q-learning agent in a ViZDoom project.
 #
+# Every scenario has a FeatureExtractor class, registered by scenario name
+# with registerExtractor. An extractor is split in two: analyze looks at the
+# frame once (objects on screen, depth buffer, game variables) and
+# actionFeatures turns that analysis into the features of one action,
+# written straight into their slots of a feature vector. The
+# analysis is cached on the frame's Perception, so scoring every action only
+# examines the frame once.
+#
+# New scenarios plug in from their own module:
+#
+#   @extractor.registerExtractor
+#   class MyExtractor(extractor.FeatureExtractor):
+#       scenario     = "my scenario"
+#       featureNames = [...]
+#       ...
+#
+
+try:
+    from vizdoom import *
+except ImportError:
+    # Without ViZDoom, the names come from its stand-in (train.py --simulator).
+    from doomSim import *
+import util, doomUtils
+import numpy as np
+
+
+# Extractor classes by scenario name, see registerExtractor.
+extractors = {}
+
+# Extractors already built by getExtractor, by scenario name.
+extractorInstances = {}
+
+
+def registerExtractor(extractorClass):
+    """
+    Registers a FeatureExtractor class for its scenario. Can be used as a
+    class decorator.
+    """
+    extractors[extractorClass.scenario] = extractorClass
+    return extractorClass
+
+
+def getExtractor(scenario):
+    """
+    Returns the extractor registered for a scenario, building it the first
+    time it's asked for.
+    """
+    if not scenario in extractorInstances:
+        extractorInstances[scenario] = extractors[scenario]()
+    return extractorInstances[scenario]
+
+
+class FeatureExtractor():
+    """
+    Base class of the feature extractors. Subclasses set the class
+    attributes below and implement analyze and actionFeatures.
+
+    scenario:      the scenario name the extractor is registered for
+    featureNames:  the features it produces; a feature's position in this
+                   list is its index in feature vectors and in the agent's
+                   weights
+    buffers:       the engine buffers it reads ("labels", "depth")
+    gameVariables: the game variables it reads from state.game_variables,
+                   in order
+    """
+    scenario      = None
+    featureNames  = []
+    buffers       = []
+    gameVariables = []
+
+    def __init__(self):
+        self.featureIndex = dict((name, i) for i, name
+                                 in enumerate(self.featureNames))
+
+    def analyze(self, state):
+        """
+        Returns whatever actionFeatures needs to know about the frame.
+        """
+        return {}
+
+    def actionFeatures(self, analysis, action, row):
+        """
+        Writes the features of an action into row, a vector of zeros indexed
+        by featureIndex. Features not written stay 0.
+        """
+        pass
+
+    def getAnalysis(self, state):
+        """
+        Returns analyze(state), computing it only once per frame. The
+        result is cached on the frame's Perception.
+        """
+        cache = state[1].cache
+        key   = ("analysis", self.scenario)
+        if not key in cache:
+            cache[key] = self.analyze(state)
+        return cache[key]
+
+    def getFeatures(self, state, action):
+        """
+        Returns the features of an action as a util.Counter of feature name
+        -> value.
+        """
+        return util.Counter(zip(self.featureNames,
+                                self.getFeatureVector(state, action).tolist()))
+
+    def getFeatureVector(self, state, action, row=None):
+        """
+        Returns the features of an action as a dense vector, indexed by
+        featureIndex. The features are written straight into row when it's
+        given (e.g. a row of a feature matrix), else into a new vector.
+        """
+        if row is None:
+            row = np.zeros(len(self.featureNames))
+        else:
+            row.fill(0)
+
+        doomUtils.counts["feature calls"] += 1
+        self.actionFeatures(self.getAnalysis(state), action, row)
+        return row
+
+    def getFeatureMatrix(self, state):
+        """
+        Returns the features of every action in the state as a matrix with
+        one row per action in all_actions and one column per feature,
+        indexed by featureIndex. The features of every action are written
+        straight into their row. The matrix is computed once per frame and
+        cached on the frame's Perception, so it must not be modified.
+        """
+        cache = state[1].cache
+        key   = ("feature matrix", self.scenario)
+        if not key in cache:
+            all_actions = state[2]
+            analysis    = self.getAnalysis(state)
+            matrix = np.zeros((len(all_actions), len(self.featureNames)))
+            for row, action in enumerate(all_actions):
+                self.actionFeatures(analysis, action, matrix[row])
+            doomUtils.counts["feature calls"] += len(all_actions)
+            cache[key] = matrix
+        return cache[key]
 
-from vizdoom import *
-import time, util, doomUtils
 
 def getFeatures(state, action):
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
+    return getExtractor(state[6]).getFeatures(state, action)
 
-    if scenario == "basic":
-        return getBasicFeatures(state, action)
-    
-    elif scenario == "health":
-        return getHealthFeatures(state, action)
 
-    elif scenario == "defend the line":
-        return getDefendTheLineFeatures(state, action)
+def getFeatureVector(state, action):
+    return getExtractor(state[6]).getFeatureVector(state, action)
 
-    elif scenario == "health gathering supreme":
-        return getHealthGatheringSupremeFeatures(state, action)
 
-    elif scenario == "defend the center":
-        return getDefendTheCenterFeatures(state, action)
+def getFeatureMatrix(state):
+    return getExtractor(state[6]).getFeatureMatrix(state)
 
 
-    
-def getBasicFeatures(state, action):
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-    
-    screen_width, screen_height = res
-    
-    center_screen  = screen_width / 2
-    
-    features   = util.Counter()
-
-    moving_left, moving_right, shooting = action
-    
-    objectKeys = list(objects.keys())
-    
-    
-    enemy_left   = False
-    enemy_center = False
-    enemy_right  = False
-
-
-    # Determine if there are enemies to the left, right, and center
-    for key in objectKeys:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        # Ignore if the object is self (value of self is 255).
-        if obj_name == 'Cacodemon':
-            # If an enemy is to the right
-            if center_screen in range(0, left):
-                enemy_right = True
-            # If an enemy is in my sights? (center)
-            if center_screen in range(left, right):
-                enemy_center = True
-            # If an enemy is to the right?
-            if center_screen in range(right, screen_width):
-                enemy_left = True
-                
-
-    # Am I moving in the wrong direction?
-    if enemy_left and moving_right:
-        features["moving-in-wrong-direction"] = 1
-    if enemy_right and moving_left:
-        features["moving-in-wrong-direction"] = 1
-            
-    # Did I shoot at nothing? If yes, value is 1. No, value is 0.
-    # List all actions that shoot.
-    if (not enemy_center) and shooting:
-        features["shot-at-nothing"] = 1
-    else:
-        features["shot-at-nothing"] = 0
-
-            
-    return features
-
-
-                
-def getHealthFeatures(state, action):
-    features   = util.Counter()
-    
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-    
-    screen_width, screen_height = res
-    
-    objectKeys = list(objects.keys())
-        
-    # Am I turning or moving forward?
-    turning_left, turning_right, moving_forward = action
-    turning = turning_left or turning_right
-
-    # Are medikits visible?
-    if len(objectKeys) == 0:
-        medikits_visible = False
-    else:
-        medikits_visible = True
-
-        
-    # What is the closest medikit?
-    closest_medikit = (None, float('inf'))
-    for key in objectKeys:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        if dist < closest_medikit[1]:
-            closest_medikit = (key, dist)
-
-    # If there is a medikit that's closest.
-    if not (closest_medikit[0] == None):
+
+class EnemyExtractor(FeatureExtractor):
+    """
+    Shared by the scenarios where enemies of one kind (enemyName) are to be
+    shot while strafing left and right.
+    """
+    featureNames  = ["moving-in-wrong-direction", "shot-at-nothing"]
+    buffers       = ["labels"]
+    enemyName     = None
+
+    def analyze(self, state):
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        objects = perception.objects
+
+        screen_width, screen_height = res
+
+        regions = doomUtils.crosshairRegions(screen_width)
+
+        # Which sectors of the screen are the enemies in?
+        enemies = [objects[key] for key in objects if objects[key][5] == self.enemyName]
+        sectors = regions.classifyAll([e[0] for e in enemies],
+                                      [e[1] for e in enemies])
+
+        enemy_left   = bool((sectors == doomUtils.LEFT).any())
+        enemy_center = bool((sectors == doomUtils.CENTER).any())
+        enemy_right  = bool((sectors == doomUtils.RIGHT).any())
+
+        return {"enemy-left":   enemy_left,
+                "enemy-center": enemy_center,
+                "enemy-right":  enemy_right}
+
+    def actionFeatures(self, analysis, action, row):
+        index = self.featureIndex
+
+        moving_left, moving_right, shooting = action
+
+        # Am I moving in the wrong direction?
+        if analysis["enemy-left"] and moving_right:
+            row[index["moving-in-wrong-direction"]] = 1
+        if analysis["enemy-right"] and moving_left:
+            row[index["moving-in-wrong-direction"]] = 1
+
+        # Did I shoot at nothing? If yes, value is 1. No, value is 0.
+        # List all actions that shoot.
+        if (not analysis["enemy-center"]) and shooting:
+            row[index["shot-at-nothing"]] = 1
+        else:
+            row[index["shot-at-nothing"]] = 0
+
+
+@registerExtractor
+class BasicExtractor(EnemyExtractor):
+    scenario  = "basic"
+    enemyName = "Cacodemon"
+
+
+@registerExtractor
+class DefendTheLineExtractor(EnemyExtractor):
+    scenario  = "defend the line"
+    enemyName = "DoomImp"
+
+
+
+@registerExtractor
+class HealthExtractor(FeatureExtractor):
+    scenario      = "health"
+    featureNames  = ["moving-toward-health", "finding-health"]
+    buffers       = ["labels", "depth"]
+
+    def analyze(self, state):
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        objects = perception.objects
+
+        screen_width, screen_height = res
+
+        objectKeys = list(objects.keys())
+
+        analysis = {}
+
+        # Are medikits visible?
+        if len(objectKeys) == 0:
+            medikits_visible = False
+        else:
+            medikits_visible = True
+
+
+        # What is the closest medikit?
+        closest_medikit = (None, float('inf'))
+        for key in objectKeys:
+            left, right, coords, dist, obj_id, obj_name = objects[key]
+            if dist < closest_medikit[1]:
+                closest_medikit = (key, dist)
+
+        # If there is a medikit that's closest.
+        medikit_left = medikit_center = medikit_right = False
+        if not (closest_medikit[0] == None):
+            # Is the closest medikit to the left, center, or right?
+            sector = doomUtils.crosshairRegions(screen_width).classify(
+                objects[closest_medikit[0]][0], objects[closest_medikit[0]][1])
+            medikit_left   = (sector == doomUtils.LEFT)
+            medikit_center = (sector == doomUtils.CENTER)
+            medikit_right  = (sector == doomUtils.RIGHT)
+
+        analysis["medikits-visible"] = medikits_visible
+        analysis["medikit-left"]     = medikit_left
+        analysis["medikit-center"]   = medikit_center
+        analysis["medikit-right"]    = medikit_right
+
+        # If no medikits are visible, which side is more open?
+        if not medikits_visible:
+            # average depth on left and right sides
+            depth = perception.depthSectors(doomUtils.edgeRegions(screen_width))
+            left_depth  = depth.mean(0)
+            right_depth = depth.mean(-1)
+
+            analysis["right-side-open"] = bool(right_depth > left_depth)
+            analysis["left-side-open"]  = not analysis["right-side-open"]
+
+        return analysis
+
+    def actionFeatures(self, analysis, action, row):
+        index = self.featureIndex
+
+        # Am I turning or moving forward?
+        turning_left, turning_right, moving_forward = action
+        turning = turning_left or turning_right
+
+        # If medikits are visible, am I moving towards them?
+        if analysis["medikits-visible"]:
+            if analysis["medikit-left"] and turning_left:
+                row[index["moving-toward-health"]] = 1
+            if analysis["medikit-center"] and moving_forward and not turning:
+                row[index["moving-toward-health"]] = 1
+            if analysis["medikit-right"] and turning_right:
+                row[index["moving-toward-health"]] = 1
+
+        # If no medikits are visible, am I turning to find medikits?
+        else:
+            row[index["finding-health"]] = 0
+            if turning_left and analysis["left-side-open"]:
+                row[index["finding-health"]] = 1
+            if turning_right and analysis["right-side-open"]:
+                row[index["finding-health"]] = 1
+
+
+
+@registerExtractor
+class HealthGatheringSupremeExtractor(FeatureExtractor):
+    scenario      = "health gathering supreme"
+    featureNames  = ["avoiding-poison", "moving-toward-health",
+                     "avoiding-walls", "finding-health"]
+    buffers       = ["labels", "depth"]
+
+    def analyze(self, state):
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        objects = perception.objects
+
+        screen_width, screen_height = res
+
+        objectKeys = list(objects.keys())
+
+        # Separate objects into medikits and poisons
+        medikits = {}
+        poisons  = {}
+        for key in objectKeys:
+            if (objects[key][5] == "CustomMedikit") or (objects[key][5] == "Medikit"):
+                medikits[key] = objects[key]
+            elif objects[key][5] == "Poison":
+                poisons[key] = objects[key]
+
+        # Are medikits and poisons visible?
+        mKeys = list(medikits.keys())
+        pKeys = list(poisons.keys())
+        medikits_visible = poisons_visible = False
+        if not len(mKeys) == 0:
+            medikits_visible = True
+
+        if not len(pKeys) == 0:
+            poisons_visible  = True
+
+        # Which medikit is closest?
+        closest_medikit = (None, float('inf'))
+        for key in mKeys:
+            left, right, coords, dist, obj_id, obj_name = objects[key]
+            if dist < closest_medikit[1]:
+                closest_medikit = (key, dist)
+
+
+        # Which poison is closest?
+        closest_poison = (None, float('inf'))
+        for key in pKeys:
+            left, right, coords, dist, obj_id, obj_name = objects[key]
+            if dist < closest_poison[1]:
+                closest_poison = (key, dist)
+
+
+        regions = doomUtils.crosshairRegions(screen_width)
         # Is the closest medikit to the left, center, or right?
         medikit_left = medikit_center = medikit_right = False
-        center = screen_width / 2
-        obj_left  = objects[closest_medikit[0]][0]
-        obj_right = objects[closest_medikit[0]][1]
-        if center in range(0, obj_left):
-            medikit_right  = True
-        elif center in range(obj_left, obj_right):
-            medikit_center = True
-        elif center in range(obj_right, screen_width):
-            medikit_left   = True
-
-    # If medikits are visible, am I moving towards them?
-    if medikits_visible:
-        if medikit_left and turning_left:
-            features["moving-toward-health"] = 1
-        if medikit_center and moving_forward and not turning:
-            features["moving-toward-health"] = 1
-        if medikit_right and turning_right:
-            features["moving-toward-health"] = 1
-
-
-
-            
-    # If no medikits are visible, am I turning to find medikits?
-    if not medikits_visible:
-        depth_buf = buffers.depth_buffer
+        if medikits_visible:
+            left, right, coords, dist, obj_id, obj_name = medikits[closest_medikit[0]]
+            sector = regions.classify(left, right)
+            medikit_left   = (sector == doomUtils.LEFT)
+            medikit_center = (sector == doomUtils.CENTER)
+            medikit_right  = (sector == doomUtils.RIGHT)
+
+
+        # Is the closest poison to the left, center, or right?
+        poison_left = poison_right = False
+        if poisons_visible:
+            left, right, coords, dist, obj_id, obj_name = poisons[closest_poison[0]]
+            sector = regions.classify(left, right)
+            poison_left   = (sector == doomUtils.LEFT)
+            poison_right  = (sector == doomUtils.RIGHT)
+
 
         # average depth on left and right sides
-        left_depth  = 0
-        right_depth = 0
-        for pixel in range(0, screen_height):
-            left_depth += depth_buf[pixel][0]
-            right_depth += depth_buf[pixel][screen_width - 1]
-        left_depth  /= float(screen_height)
-        right_depth /= float(screen_height)
+        depth = perception.depthSectors(doomUtils.edgeRegions(screen_width))
+        left_depth  = depth.mean(0)
+        right_depth = depth.mean(-1)
+
 
         if right_depth > left_depth:
             right_side_open = True
@@ -154,314 +387,200 @@ def getHealthFeatures(state, action):
         else:
             right_side_open = False
             left_side_open  = True
-            
-        features["finding-health"] = 0
-        if turning_left and left_side_open:
-            features["finding-health"] = 1
-        if turning_right and right_side_open:
-            features["finding-health"] = 1
-            
-        
-    return features
 
+        # Am I blocked on the left or right?
+        blocked_by_walls = blocked_on_left = blocked_on_right = False
+        if left_depth < 5:
+            blocked_on_left = True
+        if right_depth < 5:
+            blocked_on_right = True
+        blocked_by_walls =  blocked_on_left or blocked_on_right
+
+
+        poison_too_close = False
+        if closest_poison[1] < 70:
+            poison_too_close = True
+
+        return {"medikits-visible": medikits_visible,
+                "medikit-left":     medikit_left,
+                "medikit-center":   medikit_center,
+                "medikit-right":    medikit_right,
+                "poison-left":      poison_left,
+                "poison-right":     poison_right,
+                "poison-too-close": poison_too_close,
+                "left-side-open":   left_side_open,
+                "right-side-open":  right_side_open,
+                "blocked-by-walls": blocked_by_walls}
+
+    def actionFeatures(self, analysis, action, row):
+        index = self.featureIndex
+
+        # Am I turning or moving forward?
+        turning_left, turning_right, moving_forward = action
+        turning = turning_left or turning_right
+
+        medikits_visible = analysis["medikits-visible"]
+        blocked_by_walls = analysis["blocked-by-walls"]
+
+        # If a poison is too close
+        if analysis["poison-too-close"]:
+            if analysis["poison-left"] and turning_right and (not moving_forward):
+                row[index["avoiding-poison"]] = 10
+            if analysis["poison-right"] and turning_left and (not moving_forward):
+                row[index["avoiding-poison"]] = 10
+
+        # If medikits are visible, and I'm not blocked  am I moving towards them?
+        if medikits_visible and (not blocked_by_walls):
+            if analysis["medikit-left"] and turning_left:
+                row[index["moving-toward-health"]] = 1
+            if analysis["medikit-center"] and moving_forward and not turning:
+                row[index["moving-toward-health"]] = 1
+            if analysis["medikit-right"] and turning_right:
+                row[index["moving-toward-health"]] = 1
+
+        # If medikits are visible and I'm blocked, am I moving around the walls?
+        elif medikits_visible and blocked_by_walls:
+            if analysis["left-side-open"] and turning_left:
+                row[index["avoiding-walls"]] = 1
+            elif analysis["right-side-open"] and turning_right:
+                row[index["avoiding-walls"]] = 1
+
+        # If no medikits are visible, am I turning to find medikits?
+        elif not medikits_visible:
+            row[index["finding-health"]] = 0
+            if analysis["left-side-open"] and turning_left:
+                row[index["finding-health"]] = 1
+            if analysis["right-side-open"] and turning_right:
+                row[index["finding-health"]] = 1
+
+
+
+@registerExtractor
+class DefendTheCenterExtractor(FeatureExtractor):
+    scenario      = "defend the center"
+    featureNames  = ["moving-toward-threat", "shot-at-threat",
+                     "looking-for-threats"]
+    buffers       = ["labels"]
+    gameVariables = [GameVariable.AMMO2]
+
+    def analyze(self, state):
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        objects = perception.objects
+
+        screen_width, screen_height = res
+
+        # Separate objects into different categories
+        marines = []
+        demons  = []
+        for key in objects:
+            left, right, coords, dist, obj_id, obj_name = objects[key]
+            if obj_name == "MarineChainsaw":
+                marines.append(objects[key])
+
+            elif obj_name == "Demon":
+                demons.append(objects[key])
+
+
+        # Are marines or demons visible?
+        marines_visible = demons_visible = False
+        if len(marines) > 0:
+            marines_visible = True
+        if len(demons) > 0:
+            demons_visible = True
+
+
+        # Which marine is closest?
+        closest_marine = None
+        if marines_visible:
+            closest_marine = marines[0]
+            for m in marines:
+                left, right, coords, dist, obj_id, obj_name = m
+                if dist < closest_marine[3]:
+                    closest_marine = m
+
+        # Which demon is closest?
+        closest_demon = None
+        if demons_visible:
+            closest_demon = demons[0]
+            for d in demons:
+                left, right, coords, dist, obj_id, obj_name = d
+                if dist < closest_demon[3]:
+                    closest_demon = d
+
+        # is there a big threat on the screen?
+        big_threat = None
+        if marines_visible and closest_marine[3] < 300:
+            big_threat = closest_marine
+
+        if demons_visible  and closest_demon[3]  < 400:
+            big_threat = closest_demon
+
+
+        if big_threat == None:
+            threatened = False
+        else:
+            threatened = True
 
-def getDefendTheLineFeatures(state, action):
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-    
-    screen_width, screen_height = res
-    
-    center_screen  = screen_width / 2
-    
-    features   = util.Counter()
-
-    moving_left, moving_right, shooting = action
-    
-    objectKeys = list(objects.keys())
-    
-    
-    enemy_left   = False
-    enemy_center = False
-    enemy_right  = False
-
-
-    # Determine if there are enemies to the left, right, and center
-    for key in objectKeys:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        # Ignore if the object is self (value of self is 255).
-        if obj_name == 'DoomImp':
-            # If an enemy is to the right
-            if center_screen in range(0, left):
-                enemy_right = True
-            # If an enemy is in my sights? (center)
-            if center_screen in range(left, right):
-                enemy_center = True
-            # If an enemy is to the right?
-            if center_screen in range(right, screen_width):
-                enemy_left = True
-                
-
-    # Am I moving in the wrong direction?
-    if enemy_left and moving_right:
-        features["moving-in-wrong-direction"] = 1
-    if enemy_right and moving_left:
-        features["moving-in-wrong-direction"] = 1
-            
-    # Did I shoot at nothing? If yes, value is 1. No, value is 0.
-    # List all actions that shoot.
-    if (not enemy_center) and shooting:
-        features["shot-at-nothing"] = 1
-    else:
-        features["shot-at-nothing"] = 0
-
-            
-    return features
-    
 
+        # If there is a big threat, is it to the left, center, or right?
+        threat_left = threat_center = threat_right = False
+        if threatened:
+            left, right, coords, dist, obj_id, obj_name = big_threat
+            sector = doomUtils.crosshairRegions(screen_width).classify(left, right)
+            threat_left   = (sector == doomUtils.LEFT)
+            threat_center = (sector == doomUtils.CENTER)
+            threat_right  = (sector == doomUtils.RIGHT)
 
 
-def getHealthGatheringSupremeFeatures(state, action):
-    features   = util.Counter()
-    
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-    
-    screen_width, screen_height = res
-    
-    objectKeys = list(objects.keys())
-        
-    # Am I turning or moving forward?
-    turning_left, turning_right, moving_forward = action
-    turning = turning_left or turning_right
-
-    # Separate objects into medikits and poisons
-    medikits = {}
-    poisons  = {}
-    for key in objectKeys:
-        if (objects[key][5] == "CustomMedikit") or (objects[key][5] == "Medikit"):
-            medikits[key] = objects[key]
-        elif objects[key][5] == "Poison":
-            poisons[key] = objects[key]
-
-    # Are medikits and poisons visible?
-    mKeys = list(medikits.keys())
-    pKeys = list(poisons.keys())
-    medikits_visible = poisons_visible = False
-    if not len(mKeys) == 0:
-        medikits_visible = True
-
-    if not len(pKeys) == 0:
-        poisons_visible  = True
-
-    # Which medikit is closest?
-    closest_medikit = (None, float('inf'))
-    for key in mKeys:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        if dist < closest_medikit[1]:
-            closest_medikit = (key, dist)
-            
-
-    # Which poison is closest?
-    closest_poison = (None, float('inf'))
-    for key in pKeys:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        if dist < closest_poison[1]:
-            closest_poison = (key, dist)
-
- 
-    center = screen_width / 2        
-    # Is the closest medikit to the left, center, or right?
-    if medikits_visible:
-        medikit_left = medikit_center = medikit_right = False
-        left, right, coords, dist, obj_id, obj_name = medikits[closest_medikit[0]]
-        if center in range(0, left):
-            medikit_right  = True
-        elif center in range(left, right):
-            medikit_center = True
-        elif center in range(right, screen_width):
-            medikit_left   = True
-
-
-    # Is the closest poison to the left, center, or right?
-    if poisons_visible:
-        poison_left = poison_center = poison_right = False
-        left, right, coords, dist, obj_id, obj_name = poisons[closest_poison[0]]
-        if center in range(0, left):
-            poison_right  = True
-        elif center in range(left, right):
-            poison_center = True
-        elif center in range(right, screen_width):
-            poison_left   = True
-
-
-    # average depth on left and right sides
-    depth_buf = buffers.depth_buffer
-    left_depth  = 0
-    right_depth = 0
-    for pixel in range(0, screen_height):
-        left_depth += depth_buf[pixel][0]
-        right_depth += depth_buf[pixel][screen_width - 1]
-    left_depth  /= float(screen_height)
-    right_depth /= float(screen_height)
-
-    
-    if right_depth > left_depth:
-        right_side_open = True
-        left_side_open  = False
-    else:
-        right_side_open = False
-        left_side_open  = True
-
-    # Am I blocked on the left or right?
-    blocked_by_walls = blocked_on_left = blocked_on_right = False
-    if left_depth < 5:
-        blocked_on_left = True
-    if right_depth < 5:
-        blocked_on_right = True
-    blocked_by_walls =  blocked_on_left or blocked_on_right
-
-
-    poison_too_close = False
-    if closest_poison[1] < 70:
-        poison_too_close = True
-
-         
-    # If a poison is too close
-    if poison_too_close:
-        if poison_left and turning_right and (not moving_forward):
-            features["avoiding-poison"] = 10
-        if poison_right and turning_left and (not moving_forward):
-            features["avoiding-poison"] = 10
-            
-    # If medikits are visible, and I'm not blocked  am I moving towards them?
-    if medikits_visible and (not blocked_by_walls):
-        if medikit_left and turning_left:
-            features["moving-toward-health"] = 1
-        if medikit_center and moving_forward and not turning:
-            features["moving-toward-health"] = 1
-        if medikit_right and turning_right:
-            features["moving-toward-health"] = 1
-
-    # If medikits are visible and I'm blocked, am I moving around the walls?
-    elif medikits_visible and blocked_by_walls:
-        if left_side_open and turning_left:
-            features["avoiding-walls"] = 1
-        elif right_side_open and turning_right:
-            features["avoiding-walls"] = 1
-            
-    # If no medikits are visible, am I turning to find medikits?
-    elif not medikits_visible:
-        features["finding-health"] = 0
-        if left_side_open and turning_left:
-            features["finding-health"] = 1
-        if right_side_open and turning_right:
-            features["finding-health"] = 1
-        
-    return features
+        ammo_remaining = False
+        if buffers.game_variables[0] > 0:
+            ammo_remaining = True
+
+        return {"threatened":     threatened,
+                "threat-left":    threat_left,
+                "threat-center":  threat_center,
+                "threat-right":   threat_right,
+                "ammo-remaining": ammo_remaining}
 
+    def actionFeatures(self, analysis, action, row):
+        index = self.featureIndex
+
+        turning_left, turning_right, shooting = action
+
+        if analysis["ammo-remaining"]:
+            if analysis["threat-left"] and turning_left:
+                row[index["moving-toward-threat"]] = 1
+            if analysis["threat-right"] and turning_right:
+                row[index["moving-toward-threat"]] = 1
+
+
+            if analysis["threat-center"] and shooting:
+                row[index["moving-toward-threat"]] = 1
+                row[index["shot-at-threat"]] = 1
+                row[index["looking-for-threats"]] = 1
+
+
+
+            if (not analysis["threatened"]) and turning_left:
+                row[index["looking-for-threats"]] = 1
+
+
+
+def getBasicFeatures(state, action):
+    return getExtractor("basic").getFeatures(state, action)
+
+
+def getHealthFeatures(state, action):
+    return getExtractor("health").getFeatures(state, action)
+
+
+def getDefendTheLineFeatures(state, action):
+    return getExtractor("defend the line").getFeatures(state, action)
+
+
+def getHealthGatheringSupremeFeatures(state, action):
+    return getExtractor("health gathering supreme").getFeatures(state, action)
 
 
 def getDefendTheCenterFeatures(state, action):
-    buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-    
-    screen_width, screen_height = res
-    
-    center_screen  = int(screen_width / 2)
-    
-    features   = util.Counter()
-
-    turning_left, turning_right, shooting = action
-    
-
-    
-    # Separate objects into different categories
-    marines = []
-    demons  = []
-    for key in objects:
-        left, right, coords, dist, obj_id, obj_name = objects[key]
-        if obj_name == "MarineChainsaw":
-            marines.append(objects[key])
-
-        elif obj_name == "Demon":
-            demons.append(objects[key])
-
-
-    # Are marines or demons visible?
-    marines_visible = demons_visible = False
-    if len(marines) > 0:
-        marines_visible = True
-    if len(demons) > 0:
-        demons_visible = True
-
-
-    # Which marine is closest?
-    closest_marine = None
-    if marines_visible:
-        closest_marine = marines[0]
-        for m in marines:
-            left, right, coords, dist, obj_id, obj_name = m
-            if dist < closest_marine[3]:
-                closest_marine = m
-
-    # Which demon is closest?
-    closest_demon = None
-    if demons_visible:
-        closest_demon = demons[0]
-        for d in demons:
-            left, right, coords, dist, obj_id, obj_name = d
-            if dist < closest_demon[3]:
-                closest_demon = d
-
-    # is there a big threat on the screen?
-    big_threat = None
-    if marines_visible and closest_marine[3] < 300:
-        big_threat = closest_marine
-        
-    if demons_visible  and closest_demon[3]  < 400:
-        big_threat = closest_demon
-
-
-    if big_threat == None:
-        threatened = False
-    else:
-        threatened = True
-
-     
-    # If there is a big threat, is it to the left, center, or right?
-    threat_left = threat_center = threat_right = False
-    if threatened:
-        left, right, coords, dist, obj_id, obj_name = big_threat
-        # If an enemy is to the right
-        if center_screen in range(0, left):
-            threat_right = True
-        # If an enemy is in my sights? (center)
-        elif center_screen in range(left, right):
-            threat_center = True
-        # If an enemy is to the right?
-        elif center_screen in range(right, screen_width):
-            threat_left = True
-
-
-    ammo_remaining = False
-    if buffers.game_variables[0] > 0:
-        ammo_remaining = True
-
-    if ammo_remaining:
-        if threat_left and turning_left:
-            features["moving-toward-threat"] = 1
-        if threat_right and turning_right:
-            features["moving-toward-threat"] = 1
-
-        
-        if threat_center and shooting:
-            features["moving-toward-threat"] = 1
-            features["shot-at-threat"] = 1
-            features["looking-for-threats"] = 1
-
-    
-        
-        if (not threatened) and turning_left:
-            features["looking-for-threats"] = 1
-
-
-    
- 
-    return features
\ No newline at end of file
+    return getExtractor("defend the center").getFeatures(state, action)
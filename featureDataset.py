@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+#
+# Offline feature extraction over recordings (see recorder.py), so a change
+# to an extractor can be tried without playing the engine again.
+#
+# The episodes of a recording are shared out to a process pool. Every
+# worker maps the recording into memory and runs the frames of its
+# episodes through a registered extractor: the recording's, or with
+# --scenario another one, as long as the recording has the buffers and
+# game variables it reads. The results are written as a
+# columnar dataset: a directory with one .npy file per column, one row per
+# recorded frame.
+#
+# features.npy:  the frame's feature matrix (frames x actions x features)
+# actions.npy:   the index of the action taken
+# rewards.npy:   the rewards of the decisions up to the next recorded frame
+# decisions.npy: how many decisions that is (more than 1 for recordings of
+#                every Nth decision, see recorder.py)
+# terminals.npy: whether the frame is the last recorded one of its episode,
+#                whose rewards run to the end of the episode
+# episodes.npy:  the episode the frame belongs to
+# meta.json:     the scenario of the extractor, its feature names, the
+#                recording and the number of frames
+#
+# usage: python featureDataset.py recordings/supreme datasets/supreme
+#        python featureDataset.py recordings/center datasets/center --workers 8
+#
+
+from __future__ import print_function, division
+
+import argparse, json, multiprocessing, os, sys, timeit
+import numpy as np
+import extractor, recorder
+
+# The recording opened by this worker process, see extractEpisode.
+openRecording = None
+
+
+"""
+# Function: extractEpisode
+# ------------------------
+# Runs the frames of one episode of a recording through the extractor of a
+# scenario. The recording is opened once per worker process.
+#
+# returns: (episode, feature matrices of its frames)
+"""
+def extractEpisode(job):
+    global openRecording
+    path, scenario, episode = job
+
+    if openRecording is None or openRecording.path != path:
+        openRecording = recorder.Recording(path)
+    featureExtractor = extractor.getExtractor(scenario)
+
+    frames   = openRecording.episodeFrames(episode)
+    matrices = [featureExtractor.getFeatureMatrix(openRecording.state(i, scenario))
+                for i in frames]
+    return episode, np.array(matrices).reshape(len(frames), -1,
+                                               len(featureExtractor.featureNames))
+
+
+"""
+# Function: build
+# ---------------
+# Extracts the features of every frame of a recording into a dataset.
+#
+# recordingPath: the recording's directory
+# datasetPath:   the dataset's directory, created if needed
+# scenario:      the scenario whose extractor to use (default: the
+#                recording's); the recording must have the buffers and
+#                game variables it reads, else ValueError is raised
+# workers:       the number of worker processes (1 extracts in this one)
+#
+# returns: the number of frames
+"""
+def build(recordingPath, datasetPath, scenario=None, workers=1):
+    recording = recorder.Recording(recordingPath)
+    scenario  = scenario or recording.scenario
+    featureExtractor = extractor.getExtractor(scenario)
+    # Fails before anything is written if the recording lacks what the
+    # extractor reads.
+    recording.extractorColumns(featureExtractor)
+
+    if not os.path.isdir(datasetPath):
+        os.makedirs(datasetPath)
+    shape = (len(recording), len(recording.all_actions),
+             len(featureExtractor.featureNames))
+
+    def column(name, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(datasetPath, name + ".npy"),
+                                         mode="w+", dtype=dtype, shape=shape)
+
+    features  = column("features", np.float64, shape)
+    actions   = column("actions", np.int32, (len(recording),))
+    rewards   = column("rewards", np.float64, (len(recording),))
+    decisions = column("decisions", np.int32, (len(recording),))
+    terminals = column("terminals", bool, (len(recording),))
+    episodes  = column("episodes", np.int32, (len(recording),))
+
+    actions[:]   = recording.frames["action"]
+    rewards[:]   = recording.frames["reward"]
+    decisions[:] = recording.frames["decisions"]
+    episodes[:]  = recording.frames["episode"]
+    terminals[:] = False
+    for e in range(recording.numEpisodes):
+        frames = recording.episodeFrames(e)
+        if len(frames) > 0:
+            terminals[frames[-1]] = True
+
+    jobs = [(recordingPath, scenario, e) for e in range(recording.numEpisodes)]
+    if workers > 1:
+        pool    = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(extractEpisode, jobs)
+    else:
+        pool    = None
+        results = map(extractEpisode, jobs)
+
+    for e, matrices in results:
+        first = int(recording.episodes[e]["first"])
+        features[first:first + len(matrices)] = matrices
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    for array in [features, actions, rewards, decisions, terminals, episodes]:
+        array.flush()
+
+    meta = {
+        "scenario":     scenario,
+        "featureNames": featureExtractor.featureNames,
+        "recording":    os.path.abspath(recordingPath),
+        "every":        recording.meta["every"],
+        "frames":       len(recording),
+    }
+    with open(os.path.join(datasetPath, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return len(recording)
+
+
+"""
+# Function: load
+# --------------
+# Opens a dataset made by build, memory-mapped.
+#
+# returns: a dict of its columns, and "meta" for meta.json
+"""
+def load(path):
+    dataset = {}
+    for name in ["features", "actions", "rewards", "decisions", "terminals", "episodes"]:
+        column = os.path.join(path, name + ".npy")
+        if not os.path.exists(column):
+            raise ValueError("%s has no %s column; build it again" % (path, name))
+        dataset[name] = np.load(column, mmap_mode="r")
+    with open(os.path.join(path, "meta.json")) as f:
+        dataset["meta"] = json.load(f)
+    return dataset
+
+
+"""
+# Function: transitions
+# ---------------------
+# The transitions of a dataset in the form ApproximateQAgent.learnBatch
+# takes them: the feature vector of the action taken in every frame, the
+# feature matrix of the next frame (zeros after a terminal frame), the
+# reward and whether the next state is terminal.
+#
+# returns: the four arrays (features, nextFeatures, rewards, terminals)
+"""
+def transitions(dataset):
+    matrices  = np.asarray(dataset["features"])
+    terminals = np.asarray(dataset["terminals"])
+    frames    = np.arange(len(matrices))
+
+    features     = matrices[frames, dataset["actions"]]
+    nextFeatures = np.zeros_like(matrices)
+    nextFeatures[:-1] = matrices[1:]
+    nextFeatures[terminals] = 0.0
+    return features, nextFeatures, np.asarray(dataset["rewards"]), terminals
+
+
+"""
+# Function: discounts
+# -------------------
+# The discount of the next state of every transition: gamma to the power of
+# the decisions between the two recorded frames.
+"""
+def discounts(dataset, gamma):
+    return gamma ** np.asarray(dataset["decisions"], dtype=np.float64)
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Extract the features of a recording into a dataset.")
+    parser.add_argument("recording", help="the recording's directory")
+    parser.add_argument("dataset", help="the dataset's directory")
+    parser.add_argument("--scenario", default=None,
+                        choices=sorted(extractor.extractors.keys()),
+                        help="the scenario whose extractor to use "
+                             "(default: the recording's)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes (default: one per core)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parseArgs()
+    start   = timeit.default_timer()
+    try:
+        frames = build(options.recording, options.dataset, options.scenario,
+                       options.workers)
+    except ValueError as e:
+        sys.exit("featureDataset.py: error: %s" % e)
+    elapsed = timeit.default_timer() - start
+    print("Extracted %d frames in %.2f s (%.1f frames per second)"
+          % (frames, elapsed, frames / elapsed if elapsed > 0 else 0.0))
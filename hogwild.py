@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+# Hogwild training across CPU cores (train.py --workers N --hogwild).
+#
+# The weights live in a multiprocessing.shared_memory block, one float per
+# feature indexed by the extractor's featureIndex. Every worker process owns
+# a DoomGame and an ordinary ApproximateQAgent whose weights are a view of
+# that block, so its TD updates land in place, without locks, and every
+# other worker sees them on its next decision. Unlike actorLearner.py,
+# nothing but episode results is sent between processes. Updates that race
+# may lose each other's steps; with a few dozen sparse features that costs
+# little, and no process ever waits for another.
+#
+# Needs Python 3.8 or newer for multiprocessing.shared_memory.
+#
+
+from __future__ import print_function, division
+
+from qlearningAgent import ApproximateQAgent
+import multiprocessing, timeit
+import numpy as np
+import actorLearner, doomUtils, extractor, train
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+class SharedWeights():
+    """
+    A float array in shared memory. The trainer creates it with a size;
+    worker processes get it through fork, or attach to it by name when it
+    is pickled to them.
+    """
+    def __init__(self, size, name=None):
+        if shared_memory is None:
+            raise RuntimeError("shared weights need multiprocessing.shared_memory "
+                               "(Python 3.8 or newer)")
+        create      = name is None
+        self.size   = size
+        self.memory = shared_memory.SharedMemory(name=name, create=create,
+                                                 size=max(1, size) * 8)
+        self.array  = np.ndarray((size,), dtype=np.float64, buffer=self.memory.buf)
+        if create:
+            self.array[:] = 0.0
+
+    def __reduce__(self):
+        return (SharedWeights, (self.size, self.memory.name))
+
+    def close(self):
+        """
+        Detaches from the block. The array must not be used afterwards.
+        """
+        self.array = None
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Detaches from and frees the block, once every worker is done.
+        """
+        self.close()
+        self.memory.unlink()
+
+
+"""
+# Function: hogwildProcess
+# ------------------------
+# Plays and learns from a number of episodes in its own DoomGame, always in
+# --fast mode, updating the shared weights in place. Reports every
+# episode's total reward and, when done, its counts.
+#
+# workerId: the worker's number, from 0
+# options:  the parsed command line options
+# episodes: how many episodes to play
+# weights:  the SharedWeights
+# messages: the multiprocessing.Queue to the trainer
+"""
+def hogwildProcess(workerId, options, episodes, weights, messages):
+    options  = actorLearner.workerOptions(workerId, options)
+    scenario = options.scenario
+    settings = train.scenarios[scenario]
+    featureExtractor = extractor.getExtractor(scenario)
+
+    game        = train.createGame(settings, options, featureExtractor)
+    all_actions = settings["actions"](game.get_available_buttons_size())
+    skiprate    = options.skiprate or settings["skiprate"]
+    agent       = ApproximateQAgent(extractor=featureExtractor)
+    agent.shareWeights(weights.array)
+
+    for i in range(episodes):
+        game.new_episode()
+        doomUtils.playEpisode(game, agent, scenario, all_actions, skiprate=skiprate)
+        messages.put(("episode", workerId, game.get_total_reward()))
+
+    game.close()
+    messages.put(("done", workerId, dict(doomUtils.counts)))
+
+
+"""
+# Function: trainHogwild
+# ----------------------
+# Trains an agent with options.workers Hogwild worker processes sharing one
+# weight array. The workers' counts are added to doomUtils.counts.
+#
+# options:  the parsed command line options
+# episodes: how many training episodes to play, over all workers
+#
+# returns: an agent with a copy of the trained weights
+"""
+def trainHogwild(options, episodes):
+    featureExtractor = extractor.getExtractor(options.scenario)
+    agent            = ApproximateQAgent(extractor=featureExtractor)
+
+    weights   = SharedWeights(len(agent.weights))
+    messages  = multiprocessing.Queue()
+    processes = actorLearner.startWorkers(hogwildProcess, options, episodes,
+                                          (weights, messages))
+
+    start     = timeit.default_timer()
+    decisions = doomUtils.counts["decisions"]
+    try:
+        for message in actorLearner.receive(processes, messages):
+            pass
+        agent.weights[:] = weights.array
+    finally:
+        weights.unlink()
+
+    elapsed   = timeit.default_timer() - start
+    decisions = doomUtils.counts["decisions"] - decisions
+    if elapsed > 0:
+        print("Hogwild workers: %d, decisions: %d, decisions per second: %.1f"
+              % (len(processes), decisions, decisions / elapsed))
+    return agent
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+#
+# Benchmarks Hogwild training (train.py --workers N --hogwild) against the
+# single process agent in the real step loop: for every number of training
+# episodes asked for, both train from scratch, and the weights they end
+# with play the same seeded evaluation episodes (train.py --evaluate).
+#
+# For every run it reports the training throughput in engine ticks per
+# second, as train.py measures it over all its processes, and the mean
+# total reward of the evaluation episodes, so how fast each run learns is
+# seen by the training episodes as well as by the seconds it took. Every
+# run is its own train.py process, like real runs are.
+#
+# A run from scratch may not learn at all within a few episodes, with one
+# process or with many, depending on its first few episodes; so every run
+# is repeated over a number of seeds, and the means over all of them, with
+# how many ended up scoring above zero, are reported.
+#
+# usage: python hogwildbench.py --simulator
+#        python hogwildbench.py --scenario basic --episodes 10 20 40 --workers 2 4
+#
+
+from __future__ import print_function, division
+
+import argparse, multiprocessing, os, re, shutil, subprocess, sys, tempfile
+import numpy as np
+import train
+
+
+"""
+# Function: runTrain
+# ------------------
+# Runs train.py with the given arguments on top of the common ones.
+#
+# returns: its output
+"""
+def runTrain(options, argv):
+    argv = ([sys.executable, "train.py", "--scenario", options.scenario,
+             "--fast", "--vizdoom-dir", options.vizdoom_dir] + argv)
+    if options.simulator:
+        argv.append("--simulator")
+    output = subprocess.check_output(argv, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return output.decode("utf-8", "replace")
+
+
+"""
+# Function: trainAndEvaluate
+# --------------------------
+# Trains from a seed for a number of episodes, in one process or with Hogwild
+# workers, and plays the evaluation episodes with the weights it ends with.
+#
+# returns: (training ticks per second, mean evaluation reward)
+"""
+def trainAndEvaluate(options, seed, episodes, workers, path):
+    argv = ["--seed", str(seed), "--episodes", str(episodes),
+            "--test", "0", "--checkpoint", path]
+    if workers > 1:
+        argv += ["--workers", str(workers), "--hogwild"]
+    output = runTrain(options, argv)
+    ticksPerSecond = float(re.search(r"Ticks per second: ([0-9.]+)", output).group(1))
+
+    output  = runTrain(options, ["--seed", str(seed + episodes),
+                                 "--episodes", str(options.evaluate),
+                                 "--evaluate", path])
+    rewards = [float(r) for r in re.findall(r"total reward: (-?[0-9.]+)", output)]
+    return ticksPerSecond, float(np.mean(rewards))
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark Hogwild training against a single process.")
+    parser.add_argument("--scenario", default="health gathering supreme",
+                        choices=sorted(train.scenarios.keys()))
+    parser.add_argument("--episodes", type=int, nargs="+", default=[5, 10, 20],
+                        help="training episodes of every run (default: 5 10 20)")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Hogwild worker counts to try "
+                             "(default: 2 and one per core)")
+    parser.add_argument("--evaluate", type=int, default=5, metavar="EPISODES",
+                        help="evaluation episodes per run (default: 5)")
+    parser.add_argument("--seeds", type=int, default=3,
+                        help="seeds every run is repeated over (default: 3)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the first of the seeds (default: 0)")
+    parser.add_argument("--simulator", action="store_true",
+                        help="play the stand-in for the engine (doomSim.py)")
+    parser.add_argument("--vizdoom-dir", default="../..",
+                        help="ViZDoom directory the config and wad paths "
+                             "are relative to")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parseArgs()
+    workerCounts = [1] + sorted(set(options.workers or
+                                    [2, max(2, multiprocessing.cpu_count())]))
+
+    print("%s%s: training throughput and mean reward of %d evaluation "
+          "episodes after training, over %d seeds"
+          % (options.scenario, " (simulator)" if options.simulator else "",
+             options.evaluate, options.seeds))
+    directory = tempfile.mkdtemp(prefix="hogwildbench-")
+    try:
+        for workers in workerCounts:
+            name = ("1 process" if workers == 1
+                    else "%d Hogwild workers" % workers)
+            for episodes in options.episodes:
+                results = []
+                for seed in range(options.seed, options.seed + options.seeds):
+                    path = os.path.join(directory, "%d-%d-%d.npz"
+                                        % (workers, episodes, seed))
+                    results.append(trainAndEvaluate(options, seed, episodes,
+                                                    workers, path))
+                ticksPerSecond, rewards = zip(*results)
+                print("  %-18s %4d episodes %10.1f ticks/s  mean reward %8.1f"
+                      "  (%d/%d learned)"
+                      % (name, episodes, np.mean(ticksPerSecond), np.mean(rewards),
+                         sum(1 for r in rewards if r > 0), len(rewards)))
+    finally:
+        shutil.rmtree(directory)
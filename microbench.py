@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+#
+# Micro-benchmarks of the perception and learning hot paths, on the fixed
+# synthetic frames of benchmark.py (at 320x240 and 640x480, with 1, 8 and
+# 32 objects on screen):
+#
+# extractObjects, objectDistances:  doomUtils, per frame
+# get*Features:                     every scenario's extractor.get*Features,
+#                                   cold (analyzing the frame) and warm
+#                                   (the analysis cached on the Perception)
+# getQValue, computeActionFromQValues, update:
+#                                   ApproximateQAgent, from a frame with
+#                                   nothing cached
+# Counter:                          util.Counter operations on counters of
+#                                   8 and 256 keys
+#
+# Every benchmark reports its per-call latency, the best of a few repeats,
+# and the memory a call allocates, traced by tracemalloc: the peak above
+# what was allocated before the call, and what is still allocated after it
+# (its result included). Results can be saved as a JSON baseline and
+# compared with one, and any benchmark slower or allocating more than the
+# baseline by more than --tolerance is flagged as a regression, which also
+# makes the exit status 1. Baselines are only comparable on the machine
+# they were made on.
+#
+# usage: python microbench.py --save baselines/micro.json
+#        python microbench.py --compare baselines/micro.json
+#        python microbench.py --filter extractObjects
+#
+
+from __future__ import print_function, division
+
+import argparse, sys, timeit
+import doomUtils, extractor, train, util
+from benchmark import makeFrame, makeState, saveBaseline, loadBaseline, compareBaseline
+from qlearningAgent import ApproximateQAgent
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+resolutions = [(320, 240), (640, 480)]
+objectCounts = [1, 8, 32]
+
+# The extractor function of every scenario, and the names of the objects on
+# its frames.
+scenarioFeatures = {
+    "basic":                    (extractor.getBasicFeatures, ("Cacodemon",)),
+    "health":                   (extractor.getHealthFeatures, ("Medikit",)),
+    "health gathering supreme": (extractor.getHealthGatheringSupremeFeatures,
+                                 ("Medikit", "Poison")),
+    "defend the center":        (extractor.getDefendTheCenterFeatures,
+                                 ("MarineChainsaw", "Demon")),
+    "defend the line":          (extractor.getDefendTheLineFeatures, ("DoomImp",)),
+}
+
+# How every metric is compared with a baseline, see
+# benchmark.compareBaseline: all are better lower, and differences under a
+# microsecond or a few hundred bytes are noise.
+metrics = {
+    "seconds":       (1, 1e-6),
+    "peakBytes":     (1, 256),
+    "retainedBytes": (1, 256),
+}
+
+
+"""
+# Function: calibrate
+# -------------------
+# The number of calls of func that take at least minimum seconds.
+"""
+def calibrate(func, minimum=0.02):
+    number = 1
+    while True:
+        if timeit.timeit(func, number=number) >= minimum or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+"""
+# Function: allocations
+# ---------------------
+# The bytes allocated by one call of func, as (peak, retained), or
+# (None, None) without tracemalloc.
+"""
+def allocations(func):
+    if tracemalloc is None:
+        return None, None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak - before, current - before
+
+
+"""
+# Function: measure
+# -----------------
+# Measures a function of no arguments, after a call to warm it up.
+#
+# returns: {"seconds": per call, "peakBytes": ..., "retainedBytes": ...}
+"""
+def measure(func, repeat=5):
+    func()
+    number  = calibrate(func)
+    seconds = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    peak, retained = allocations(func)
+    return {"seconds": seconds, "peakBytes": peak, "retainedBytes": retained}
+
+
+"""
+# Function: cold
+# --------------
+# Wraps a call on states so every call starts from Perceptions with
+# nothing cached, like the first call on a new frame does.
+"""
+def cold(func, *states):
+    def call():
+        for state in states:
+            state[1].cache.clear()
+        return func()
+    return call
+
+
+"""
+# Function: frameName
+# -------------------
+# The part of a benchmark's name telling the frame apart.
+"""
+def frameName(resolution, numObjects):
+    return "%dx%d %2d objects" % (resolution[0], resolution[1], numObjects)
+
+
+"""
+# Function: benchmarks
+# --------------------
+# Builds every benchmark.
+#
+# returns: a list of (name, function of no arguments) pairs
+"""
+def benchmarks():
+    my_pos  = (0.0, 0.0, 0.0)
+    entries = []
+
+    for resolution in resolutions:
+        for numObjects in objectCounts:
+            frame = makeFrame(resolution, numObjects)
+            perception = doomUtils.Perception(frame, resolution, my_pos)
+            where = frameName(resolution, numObjects)
+            entries.append(("extractObjects " + where,
+                            lambda p=perception: doomUtils.extractObjects(p)))
+            entries.append(("objectDistances " + where,
+                            lambda f=frame: doomUtils.objectDistances(f, my_pos)))
+
+    for scenario in sorted(scenarioFeatures):
+        getFeatures, names = scenarioFeatures[scenario]
+        all_actions = train.scenarios[scenario]["actions"](3)
+        action = all_actions[-1]
+        for resolution in resolutions:
+            for numObjects in objectCounts:
+                state = makeState(makeFrame(resolution, numObjects, names),
+                                  resolution, scenario, all_actions)
+                where = "%s %s" % (scenario, frameName(resolution, numObjects))
+                call  = lambda s=state, f=getFeatures: f(s, action)
+                entries.append(("%s cold %s" % (getFeatures.__name__, where),
+                                cold(call, state)))
+                entries.append(("%s warm %s" % (getFeatures.__name__, where), call))
+
+    scenario    = "health gathering supreme"
+    names       = scenarioFeatures[scenario][1]
+    all_actions = train.scenarios[scenario]["actions"](3)
+    for resolution in resolutions:
+        for numObjects in objectCounts:
+            state     = makeState(makeFrame(resolution, numObjects, names, seed=0),
+                                  resolution, scenario, all_actions)
+            nextState = makeState(makeFrame(resolution, numObjects, names, seed=1),
+                                  resolution, scenario, all_actions)
+            # Learning the same transition over and over only converges
+            # with a small step, since avoiding-poison reaches 10.
+            agent = ApproximateQAgent(extractor=extractor.getExtractor(scenario))
+            agent.alpha = 0.001
+            where = "%s %s" % (scenario, frameName(resolution, numObjects))
+            action = all_actions[-1]
+            entries.append(("getQValue " + where,
+                            cold(lambda a=agent, s=state: a.getQValue(s, action), state)))
+            entries.append(("computeActionFromQValues " + where,
+                            cold(lambda a=agent, s=state: a.computeActionFromQValues(s),
+                                 state)))
+            entries.append(("update " + where,
+                            cold(lambda a=agent, s=state, n=nextState:
+                                 a.update(s, action, n, 1.0), state, nextState)))
+
+    for size in [8, 256]:
+        keys  = ["feature-%d" % i for i in range(size)]
+        first = util.Counter()
+        other = util.Counter()
+        for i, key in enumerate(keys):
+            first[key] = i + 1.0
+            other[key] = size - i
+        where = "%d keys" % size
+        entries += [
+            ("Counter missing key " + where,  lambda c=first: c["missing"]),
+            ("Counter incrementAll " + where, lambda c=first.copy(), k=keys: c.incrementAll(k, 1)),
+            ("Counter argMax " + where,       lambda c=first: c.argMax()),
+            ("Counter sortedKeys " + where,   lambda c=first: c.sortedKeys()),
+            ("Counter totalCount " + where,   lambda c=first: c.totalCount()),
+            ("Counter normalize " + where,    lambda c=first.copy(): c.normalize()),
+            ("Counter copy " + where,         lambda c=first: c.copy()),
+            ("Counter dot product " + where,  lambda c=first, o=other: c * o),
+            ("Counter add " + where,          lambda c=first, o=other: c + o),
+        ]
+
+    return entries
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the perception and learning hot paths.")
+    parser.add_argument("--save", default=None, metavar="PATH",
+                        help="save the results as a JSON baseline")
+    parser.add_argument("--compare", default=None, metavar="PATH",
+                        help="compare the results with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much worse than the baseline a result may "
+                             "be, relatively (default: 0.25)")
+    parser.add_argument("--filter", default=None, metavar="TEXT",
+                        help="only run the benchmarks whose name contains TEXT")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="repeats to take the best latency of (default: 5)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parseArgs()
+    if tracemalloc is None:
+        print("tracemalloc is not available, allocations are not measured")
+
+    results = {}
+    for name, func in benchmarks():
+        if options.filter is not None and not options.filter in name:
+            continue
+        results[name] = result = measure(func, options.repeat)
+        print("%-64s %10.2f us %10.1f KB peak %10d B retained"
+              % (name, result["seconds"] * 1e6, (result["peakBytes"] or 0) / 1024.0,
+                 result["retainedBytes"] or 0))
+
+    if options.save is not None:
+        saveBaseline(options.save, results)
+        print("Baseline of %d benchmarks saved to %s" % (len(results), options.save))
+
+    if options.compare is not None:
+        print("Compared with %s:" % options.compare)
+        regressions = compareBaseline(results, loadBaseline(options.compare),
+                                      metrics, options.tolerance)
+        print("%d regressions" % len(regressions))
+        if regressions:
+            sys.exit(1)
@@ -17,19 +17,69 @@
 #
 #
 
-from vizdoom import *
-import random, util, extractor, math
+try:
+    from vizdoom import *
+except ImportError:
+    # Without ViZDoom, the names come from its stand-in (train.py --simulator).
+    from doomSim import *
+import random, util, extractor
+import numpy as np
 
 class ApproximateQAgent():
     def __init__(self, **args):
 
-        self.weights = util.Counter()
+        # Weights are a float array indexed by the featureIndex of the
+        # extractor bound to the agent, see bindExtractor.
+        self.extractor = None
+        self.weights   = None
+        self.updates   = 0
         self.epsilon = 0.05
         self.gamma   = 0.8
         self.alpha   = 0.2
+
+        # Optional experience replay: every transition is also stored in
+        # the replay buffer, and a minibatch sampled from it learned from.
+        self.replay    = args.get("replay")
+        self.minibatch = args.get("minibatch", 32)
+
+        if args.get("extractor") is not None:
+            self.bindExtractor(args["extractor"])
+
+    def bindExtractor(self, featureExtractor):
+        """
+        Binds the feature extractor of the scenario to the agent, and
+        starts it off with zero weights for its features.
+        """
+        self.extractor = featureExtractor
+        self.weights   = np.zeros(len(featureExtractor.featureNames))
+
+    def shareWeights(self, weights):
+        """
+        Uses weights, an array indexed like the bound extractor's
+        featureIndex (e.g. a view of shared memory), as the agent's own.
+        Updates are applied to it in place.
+        """
+        self.weights = weights
+        self.updates += 1
+
+    def getExtractor(self, scenario):
+        """
+        Returns the bound extractor. Agents built without one are bound to
+        the extractor registered for the scenario of the first state seen.
+        """
+        if self.extractor is None:
+            self.bindExtractor(extractor.getExtractor(scenario))
+        return self.extractor
         
     def getWeights(self):
-        return self.weights
+        """
+        Returns the weights by feature name, as a util.Counter.
+        """
+        weights = util.Counter()
+        if self.extractor is not None:
+            for name, i in self.extractor.featureIndex.items():
+                weights[name] = float(self.weights[i])
+        return weights
 
     def stopTraining(self):
         self.epsilon = 0.0
@@ -43,14 +93,30 @@ class ApproximateQAgent():
         or the Q node value otherwise
         """
 
-        featureVector = extractor.getFeatures(state, action)
-        
-        keys = featureVector.sortedKeys()
-        qSum = 0
-        for key in keys:
-            qSum += self.getWeights()[key] * featureVector[key]
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+
+        featureVector = self.getExtractor(scenario).getFeatureVector(state, action)
 
-        return qSum
+        return float(self.weights.dot(featureVector))
+
+    def getQValues(self, state):
+        """
+        Returns [Q(state, action) for action in all_actions], scoring every
+        action from one feature matrix. The Q-values are cached on the
+        state's Perception until the weights next change, so getAction and
+        the update that follows it share them. The feature matrix itself is
+        cached for the whole frame, so the next state's features are only
+        extracted once, by update, and reused by the next getAction.
+        """
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+
+        key = (id(self), self.updates)
+        if perception.cache.get("q-values", (None,))[0] != key:
+            matrix  = self.getExtractor(scenario).getFeatureMatrix(state)
+            qValues = list(matrix.dot(self.weights))
+            perception.cache["q-values"] = (key, qValues)
+
+        return perception.cache["q-values"][1]
 
 
     def computeValueFromQValues(self, state):
@@ -60,7 +126,7 @@ class ApproximateQAgent():
         there are no legal actions, which is the case at the
         terminal state, you should return a value of 0.0.
         """
-        buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
         
         maxQValue = float('-inf')
 
@@ -69,8 +135,8 @@ class ApproximateQAgent():
             return 0.0
 
         # Determine the maximum q value for all actions
-        for a in all_actions:
-            maxQValue = max(maxQValue, self.getQValue(state, a))
+        for qVal in self.getQValues(state):
+            maxQValue = max(maxQValue, qVal)
 
         # Return the maximum q value
         return maxQValue
@@ -81,18 +147,18 @@ class ApproximateQAgent():
         are no legal actions, which is the case at the terminal state,
         you should return None.
         """
-        buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
-
-        maxQValue  = self.computeValueFromQValues(state)
-        maxActions = []
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
 
         # If the state is a terminal state, return None
         if isTerminal:
             return None
 
+        qValues    = self.getQValues(state)
+        maxQValue  = max(qValues)
+        maxActions = []
+
         # Make a list of all actions that have qVal = maxQVal
-        for a in all_actions:
-            qVal = self.getQValue(state, a)
+        for a, qVal in zip(all_actions, qValues):
             if qVal == maxQValue:
                 maxActions.append(a)
 
@@ -109,7 +175,7 @@ class ApproximateQAgent():
 
         action = None
 
-        buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
 
         # if state == 'TERMINAL STATE': return None
         if isTerminal:
@@ -125,27 +191,105 @@ class ApproximateQAgent():
         
         return action
 
+    def getBatchActions(self, featureMatrices):
+        """
+        Compute the actions to take in a batch of states, given as their
+        feature matrices (states x actions x features), the way getAction
+        does for one state. The Q-values of the whole batch come from one
+        product with the weights.
+
+        Returns the index of the chosen action in every state.
+        """
+        qValues = featureMatrices.dot(self.weights)
+
+        # Best actions, with ties broken at random
+        best    = qValues == qValues.max(axis=1)[:, np.newaxis]
+        actions = (best * np.random.random_sample(best.shape)).argmax(axis=1)
+
+        # Random actions, with probability self.epsilon
+        explore = np.random.random_sample(len(actions)) < self.epsilon
+        actions[explore] = np.random.randint(qValues.shape[1], size=explore.sum())
+
+        return actions
+
 
     def update(self, state, action, nextState, reward):
         """
         Update weights based off on transition
         """
         
-        buffers, objects, all_actions, prev_action, res, isTerminal, scenario = state
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = state
+
+        # The action's features and Q-value, from what getAction cached.
+        a             = all_actions.index(action)
+        featureVector = self.getExtractor(scenario).getFeatureMatrix(state)[a]
 
         # Calculate "difference", to be used in weight calculation
         maxQ  = self.computeValueFromQValues(nextState)
-        Qsa   = self.getQValue(state, action)
+        Qsa   = self.getQValues(state)[a]
 
         difference = (reward + self.gamma * maxQ) - Qsa
 
         # Update weights
-        featureVector = extractor.getFeatures(state, action)
-        featureKeys   = featureVector.sortedKeys()
-        weightKeys    = self.weights.sortedKeys()
+        self.weights += self.alpha * difference * featureVector
+        self.updates += 1
+
+        if self.replay is not None and self.alpha > 0:
+            self.replayUpdate(featureVector, nextState, reward)
+
+    def replayUpdate(self, featureVector, nextState, reward):
+        """
+        Stores the transition in the replay buffer, and learns from a
+        minibatch sampled from it once it holds enough transitions.
+        """
+        buffers, perception, all_actions, prev_action, res, isTerminal, scenario = nextState
+
+        nextFeatures = None
+        if not isTerminal:
+            nextFeatures = self.getExtractor(scenario).getFeatureMatrix(nextState)
+        self.replay.add(featureVector, nextFeatures, reward, isTerminal)
+
+        if len(self.replay) >= self.minibatch:
+            indices, transitions, weights = self.replay.sample(self.minibatch)
+            differences = self.learnBatch(*transitions, average=True,
+                                          sampleWeights=weights)
+            self.replay.updatePriorities(indices, differences)
+
+    def learn(self, featureVector, nextFeatures, reward, isTerminal):
+        """
+        Update weights based off on a transition given as features: the
+        feature vector of the action taken, the feature matrix of the
+        next state (one row per action) and whether it is terminal. Used
+        by learners that never see the states themselves.
+        """
+        maxQ = 0.0
+        if not isTerminal:
+            maxQ = nextFeatures.dot(self.weights).max()
+
+        difference = (reward + self.gamma * maxQ) - self.weights.dot(featureVector)
+
+        self.weights += self.alpha * difference * featureVector
+        self.updates += 1
+        return difference
+
+    def learnBatch(self, features, nextFeatures, rewards, terminals, average=False,
+                   sampleWeights=None):
+        """
+        Update weights based off on a batch of transitions, given as
+        arrays of what learn takes. Every difference is computed with the
+        weights from before the batch, and their updates are summed, or
+        with average (for minibatches sampled from replay) averaged.
+        sampleWeights scales every transition's update, e.g. by its
+        importance sampling weight. Returns the unscaled differences.
+        """
+        maxQ = np.where(terminals, 0.0, nextFeatures.dot(self.weights).max(axis=1))
 
-        for fkey in featureKeys:
-            self.weights[fkey] = (self.weights[fkey] +
-                                  self.alpha * difference *
-                                  featureVector[fkey])
+        differences = (rewards + self.gamma * maxQ) - features.dot(self.weights)
 
+        step = self.alpha
+        if average:
+            step /= len(differences)
+        scaled = differences if sampleWeights is None else differences * sampleWeights
+        self.weights += step * scaled.dot(features)
+        self.updates += 1
+        return differences
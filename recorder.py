@@ -0,0 +1,414 @@
+#
+# Recording of episodes for offline use (train.py --record DIR), so a new
+# extractor can be tried on recorded frames without running the engine.
+#
+# A recording is a directory of append-only files:
+#
+# labels.u8, depth.u8: the labels and depth buffers of every recorded
+#                      frame, one after the other, as raw bytes
+# frames.bin:          a record per frame: its episode, frame number, the
+#                      index of the action taken, the rewards of the
+#                      decisions up to the next recorded frame and how many
+#                      they are, the marine's position, the game variables
+#                      (the extractor's first, then the rest of the
+#                      config's), and where its labels are in objects.bin
+# objects.bin:         a record per label: its value, object id, object
+#                      name (as an index into the names in meta.json) and
+#                      position
+# episodes.bin:        a record per episode: its first frame, its number of
+#                      frames and its total reward
+# meta.json:           the small index tying them together: the scenario,
+#                      the recorded resolution, the downsampling, the
+#                      buffers, the names of the game variables, the
+#                      actions, the object names and how many frames and
+#                      episodes are complete. It is written as soon as the
+#                      recording is started, so the data files are never
+#                      next to the meta.json of an older recording.
+#
+# Frames are downsampled in time (every'th decision is recorded) and in
+# space (every scale'th row and column of the buffers is kept). The rewards
+# of the decisions that are not recorded are added to the reward of the
+# frame recorded before them, undiscounted, so no reward is lost. The
+# Recording reader maps the files into memory, so the buffers of a frame
+# are views into the page cache and opening any frame copies nothing.
+# RecordedGame plays a recording back in place of the engine.
+#
+
+import json, os
+import numpy as np
+import doomSim, doomUtils, extractor
+
+# Bumped whenever the layout of a recording changes.
+FORMAT = 3
+
+OBJECT  = np.dtype([("value", "u1"), ("id", "<i4"), ("name", "<i4"),
+                    ("position", "<f8", (3,))])
+EPISODE = np.dtype([("first", "<i8"), ("frames", "<i8"), ("totalReward", "<f8")])
+
+"""
+# Function: frameType
+# -------------------
+# The record of a frame in frames.bin, for a number of game variables.
+"""
+def frameType(numVariables):
+    return np.dtype([("episode", "<i4"), ("number", "<i4"), ("action", "<i4"),
+                     ("reward", "<f8"), ("decisions", "<i4"),
+                     ("position", "<f8", (3,)),
+                     ("variables", "<f8", (numVariables,)),
+                     ("objects", "<i8"), ("numObjects", "<i4")])
+
+
+class Recorder():
+    """
+    Appends the frames of the step loop to a recording. Call
+    startEpisode before every episode, record(state, action, reward) after
+    every action (it is an onStep function for doomUtils.playEpisode), and
+    endEpisode(totalReward) after it. meta.json is rewritten after every
+    episode, so a recording cut short keeps all complete episodes.
+    variables are the names of the game variables in the states, in order.
+    """
+    def __init__(self, path, scenario, all_actions, every=1, scale=1, variables=()):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path        = path
+        self.scenario    = scenario
+        self.all_actions = all_actions
+        self.every       = every
+        self.scale       = scale
+        self.variables   = list(variables)
+        self.names       = []
+        self.nameIndex   = {}
+        self.resolution  = None
+        self.frameType   = frameType(len(self.variables))
+        self.frames      = 0
+        self.objects     = 0
+        self.episodes    = 0
+        self.first       = 0
+        self.decisions   = 0
+        self.pending     = None    # the last frame, still adding up rewards
+
+        self.files = dict((name, open(os.path.join(path, name), "wb"))
+                          for name in ["labels.u8", "depth.u8", "frames.bin",
+                                       "objects.bin", "episodes.bin"])
+        self.writeMeta()
+
+    def startEpisode(self):
+        self.first     = self.frames
+        self.decisions = 0
+
+    def record(self, state, action, reward):
+        """
+        Records a frame of the step loop, if it is an every'th decision,
+        and otherwise adds the reward to the frame recorded last.
+        """
+        self.decisions += 1
+        if (self.decisions - 1) % self.every != 0:
+            self.pending[0]["reward"]    += reward
+            self.pending[0]["decisions"] += 1
+            return
+        self.writeFrame()
+
+        gs, perception, all_actions, prev_action, res, isTerminal, scenario = state
+        s = self.scale
+        labels = gs.labels_buffer[::s, ::s]
+        depth  = gs.depth_buffer[::s, ::s]
+        variables = np.asarray(gs.game_variables, dtype=np.float64)
+
+        if self.resolution is None:
+            self.resolution = (labels.shape[1], labels.shape[0])
+        if len(variables) != len(self.variables):
+            raise ValueError("the state has %d game variables, the recording %s"
+                             % (len(variables), self.variables))
+
+        objects = np.zeros(len(gs.labels), dtype=OBJECT)
+        for i, l in enumerate(gs.labels):
+            if not l.object_name in self.nameIndex:
+                self.nameIndex[l.object_name] = len(self.names)
+                self.names.append(l.object_name)
+            objects[i] = (l.value, l.object_id, self.nameIndex[l.object_name],
+                          (l.object_position_x, l.object_position_y,
+                           l.object_position_z))
+
+        frame = np.zeros(1, dtype=self.frameType)
+        frame[0] = (self.episodes, gs.number, all_actions.index(action), reward, 1,
+                    perception.my_pos, variables, self.objects, len(objects))
+
+        self.files["labels.u8"].write(np.ascontiguousarray(labels, dtype=np.uint8).tobytes())
+        self.files["depth.u8"].write(np.ascontiguousarray(depth, dtype=np.uint8).tobytes())
+        self.files["objects.bin"].write(objects.tobytes())
+        self.pending  = frame
+        self.frames  += 1
+        self.objects += len(objects)
+
+    def writeFrame(self):
+        """
+        Writes the last frame recorded, once the rewards of the decisions
+        after it are added up.
+        """
+        if self.pending is not None:
+            self.files["frames.bin"].write(self.pending.tobytes())
+            self.pending = None
+
+    def endEpisode(self, totalReward):
+        self.writeFrame()
+        episode = np.array([(self.first, self.frames - self.first, totalReward)],
+                           dtype=EPISODE)
+        self.files["episodes.bin"].write(episode.tobytes())
+        self.episodes += 1
+        for f in self.files.values():
+            f.flush()
+        self.writeMeta()
+
+    def writeMeta(self):
+        meta = {
+            "format":       FORMAT,
+            "scenario":     self.scenario,
+            "resolution":   self.resolution,
+            "every":        self.every,
+            "scale":        self.scale,
+            "buffers":      ["labels", "depth"],
+            "variables":    self.variables,
+            "actions":      [list(map(bool, a)) for a in self.all_actions],
+            "names":        self.names,
+            "frames":       self.frames,
+            "episodes":     self.episodes,
+        }
+        temp = os.path.join(self.path, "meta.json.tmp")
+        with open(temp, "w") as f:
+            json.dump(meta, f)
+        getattr(os, "replace", os.rename)(temp, os.path.join(self.path, "meta.json"))
+
+    def close(self):
+        self.writeFrame()
+        for f in self.files.values():
+            f.close()
+        self.writeMeta()
+
+
+class RecordedLabel():
+    """
+    A label of a recorded frame, with the attributes of a ViZDoom label.
+    """
+    def __init__(self, record, name):
+        self.value       = int(record["value"])
+        self.object_id   = int(record["id"])
+        self.object_name = name
+        self.object_position_x, self.object_position_y, self.object_position_z = \
+            record["position"].tolist()
+
+
+class RecordedFrame():
+    """
+    A recorded frame, with the attributes of a ViZDoom game state that
+    Perception and the extractors read. The buffers are views of the
+    recording's memory maps.
+    """
+    def __init__(self, number, labels, labels_buffer, depth_buffer, game_variables):
+        self.number         = number
+        self.labels         = labels
+        self.labels_buffer  = labels_buffer
+        self.depth_buffer   = depth_buffer
+        self.game_variables = game_variables
+
+
+class Recording():
+    """
+    Reads a recording made by Recorder. Only the frames and episodes
+    counted in meta.json are seen.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format"] != FORMAT:
+            raise ValueError("%s is a format %d recording, expected format %d"
+                             % (path, self.meta["format"], FORMAT))
+
+        self.path        = path
+        self.scenario    = self.meta["scenario"]
+        self.names       = self.meta["names"]
+        self.all_actions = self.meta["actions"]
+        self.numFrames   = self.meta["frames"]
+        self.numEpisodes = self.meta["episodes"]
+        self.resolution  = tuple(self.meta["resolution"] or (0, 0))
+        self.buffers     = self.meta["buffers"]
+        self.variables   = self.meta["variables"]
+        width, height    = self.resolution
+
+        self.frames   = self.map("frames.bin", frameType(len(self.variables)), self.numFrames)
+        self.episodes = self.map("episodes.bin", EPISODE, self.numEpisodes)
+        self.labels   = self.map("labels.u8", np.uint8, self.numFrames, (height, width))
+        self.depth    = self.map("depth.u8", np.uint8, self.numFrames, (height, width))
+        numObjects = 0
+        if self.numFrames > 0:
+            last = self.frames[self.numFrames - 1]
+            numObjects = int(last["objects"] + last["numObjects"])
+        self.objects  = self.map("objects.bin", OBJECT, numObjects)
+
+        self.variableColumns = {}    # by scenario, see extractorColumns
+
+    def map(self, name, dtype, count, shape=()):
+        """
+        Maps the first count records of a file read only.
+        """
+        if count == 0:
+            return np.zeros((0,) + shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r",
+                         shape=(count,) + shape)
+
+    def __len__(self):
+        return self.numFrames
+
+    def frame(self, i):
+        """
+        Returns recorded frame i as a RecordedFrame.
+        """
+        record  = self.frames[i]
+        first   = int(record["objects"])
+        objects = self.objects[first:first + int(record["numObjects"])]
+        labels  = [RecordedLabel(o, self.names[o["name"]]) for o in objects]
+        return RecordedFrame(int(record["number"]), labels, self.labels[i],
+                             self.depth[i], record["variables"])
+
+    def action(self, i):
+        """
+        Returns the action taken in frame i.
+        """
+        return self.all_actions[int(self.frames[i]["action"])]
+
+    def extractorColumns(self, featureExtractor):
+        """
+        Returns the columns of the recorded game variables an extractor
+        reads, in the order it reads them. Raises ValueError if the
+        recording lacks any buffer or game variable the extractor needs.
+        """
+        scenario = featureExtractor.scenario
+        if not scenario in self.variableColumns:
+            variables = [doomSim.nameOf(v) for v in featureExtractor.gameVariables]
+            missing   = ([b + " buffer" for b in featureExtractor.buffers
+                          if not b in self.buffers] +
+                         [v for v in variables if not v in self.variables])
+            if missing:
+                raise ValueError("%s has no %s, which the %s extractor reads "
+                                 "(recorded buffers: %s; game variables: %s)"
+                                 % (self.path, ", ".join(missing), scenario,
+                                    ", ".join(self.buffers),
+                                    ", ".join(self.variables) or "none"))
+            self.variableColumns[scenario] = np.array(
+                [self.variables.index(v) for v in variables], dtype=np.intp)
+        return self.variableColumns[scenario]
+
+    def state(self, i, scenario=None):
+        """
+        Returns frame i as the state tuple built by doomUtils.getGameState,
+        so the extractors can run on it. The state is of the recording's
+        scenario unless another is given, whose extractor then gets the
+        game variables it reads, in its order (see extractorColumns).
+        """
+        record = self.frames[i]
+        frame  = self.frame(i)
+        if scenario is not None and scenario != self.scenario:
+            columns = self.extractorColumns(extractor.getExtractor(scenario))
+            frame.game_variables = frame.game_variables[columns]
+        return (frame,
+                doomUtils.Perception(frame, self.resolution,
+                                     tuple(record["position"].tolist())),
+                self.all_actions,
+                None,
+                self.resolution,
+                False,
+                scenario or self.scenario)
+
+    def episodeFrames(self, e):
+        """
+        Returns the range of the frames of episode e.
+        """
+        first = int(self.episodes[e]["first"])
+        return range(first, first + int(self.episodes[e]["frames"]))
+
+
+class RecordedGame():
+    """
+    Plays a recording back with the methods of a DoomGame the step loop
+    (doomUtils.playEpisode) calls, as a stand-in for the engine. The
+    recorded episodes are played in turn, starting over after the last,
+    and every action moves on to the next recorded frame and gets its
+    recorded reward, whatever the action is. With every > 1, an action
+    stands for the decisions up to the next recorded frame. Only the marine's position
+    can be read with get_game_variable; the recorded game variables are in
+    the states.
+    """
+    def __init__(self, path):
+        self.recording   = Recording(path)
+        self.all_actions = self.recording.all_actions
+        self.episode     = -1
+        self.frame       = 0
+        self.end         = 0
+        self.number      = 0
+        self.time        = 0
+        self.totalReward = 0.0
+        self.lastAction  = None
+        if self.recording.numEpisodes == 0:
+            raise ValueError("%s has no complete episodes" % path)
+
+    def new_episode(self):
+        self.episode     = (self.episode + 1) % self.recording.numEpisodes
+        record           = self.recording.episodes[self.episode]
+        self.frame       = int(record["first"])
+        self.end         = self.frame + int(record["frames"])
+        self.time        = 0
+        self.totalReward = 0.0
+        self.lastAction  = None
+        self.number     += 1
+
+    def is_episode_finished(self):
+        return self.frame >= self.end
+
+    def get_state(self):
+        if self.is_episode_finished():
+            return None
+        frame = self.recording.frame(self.frame)
+        # Numbered by play, since an episode played again has the same
+        # recorded numbers.
+        frame.number = self.number
+        return frame
+
+    def make_action(self, action, tics=1):
+        if self.is_episode_finished():
+            return 0.0
+        record = self.recording.frames[self.frame]
+        reward = float(record["reward"])
+        self.frame       += 1
+        self.number      += 1
+        self.time        += tics * int(record["decisions"])
+        self.totalReward += reward
+        self.lastAction   = action
+        return reward
+
+    def get_game_variable(self, variable):
+        name = getattr(variable, "name", str(variable))
+        axes = {"POSITION_X": 0, "POSITION_Y": 1, "POSITION_Z": 2}
+        if not name in axes:
+            raise ValueError("a recording only has the marine's position, not %s" % name)
+        frame = min(self.frame, self.end - 1)
+        return float(self.recording.frames[frame]["position"][axes[name]])
+
+    def get_last_action(self):
+        return self.lastAction
+
+    def get_episode_time(self):
+        return self.time
+
+    def get_total_reward(self):
+        return self.totalReward
+
+    def get_available_buttons_size(self):
+        return len(self.all_actions[0])
+
+    def get_screen_width(self):
+        return self.recording.resolution[0]
+
+    def get_screen_height(self):
+        return self.recording.resolution[1]
+
+    def close(self):
+        pass
@@ -0,0 +1,224 @@
+#
+# Experience replay for the approximate q-learning agent (train.py --replay).
+#
+# Transitions are stored the way actorLearner.py ships them: the feature
+# vector of the action taken, the feature matrix of the next state (one row
+# per action), the reward and whether the next state is terminal. The
+# arrays are allocated up front at full capacity, so memory is fixed by the
+# capacity and the number of actions and features.
+#
+# PrioritizedReplayBuffer samples transitions in proportion to their last
+# TD error instead, from a SumTree, and weights them to correct for it.
+#
+
+import numpy as np
+
+
+class ReplayBuffer():
+    """
+    A fixed capacity ring buffer of transitions. Once full, every add
+    overwrites the oldest transition. Adding a transition and sampling
+    one are O(1).
+    """
+    def __init__(self, capacity, numActions, numFeatures):
+        self.capacity     = capacity
+        self.size         = 0
+        self.next         = 0
+        self.features     = np.zeros((capacity, numFeatures))
+        self.nextFeatures = np.zeros((capacity, numActions, numFeatures))
+        self.rewards      = np.zeros(capacity)
+        self.terminals    = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        """
+        Returns the bytes taken by the arrays.
+        """
+        return (self.features.nbytes + self.nextFeatures.nbytes +
+                self.rewards.nbytes + self.terminals.nbytes)
+
+    def add(self, featureVector, nextFeatures, reward, isTerminal):
+        """
+        Stores a transition. nextFeatures may be None when isTerminal, and
+        then is stored as zeros.
+
+        returns: the index the transition is stored at
+        """
+        i = self.next
+        self.features[i] = featureVector
+        if nextFeatures is None:
+            self.nextFeatures[i] = 0.0
+        else:
+            self.nextFeatures[i] = nextFeatures
+        self.rewards[i]   = reward
+        self.terminals[i] = isTerminal
+
+        self.next = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def get(self, indices):
+        """
+        Returns the transitions at indices as the arrays
+        (features, nextFeatures, rewards, terminals).
+        """
+        return (self.features[indices], self.nextFeatures[indices],
+                self.rewards[indices], self.terminals[indices])
+
+    def sample(self, n):
+        """
+        Samples n stored transitions uniformly, with replacement.
+
+        returns: (indices, transitions, weights), with the transitions as
+                 in get and the weights None, since all are equal
+        """
+        indices = np.random.randint(self.size, size=n)
+        return indices, self.get(indices), None
+
+    def updatePriorities(self, indices, differences):
+        """
+        Called with the TD errors of the sampled transitions after learning
+        from them. Uniform replay has no use for them.
+        """
+        pass
+
+
+class SumTree():
+    """
+    Proportional sampling over a fixed number of priorities. The leaves of
+    a complete binary tree hold the priorities and every inner node the
+    sum of its children, all in one array with the root at 1 and the
+    children of node i at 2i and 2i + 1. Updating priorities and sampling
+    walk one level of the tree at a time for a whole batch at once, so a
+    batch of k costs O(k log n) in a few NumPy operations per level.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.depth    = max(1, int(np.ceil(np.log2(capacity))))
+        self.leaves   = 1 << self.depth
+        self.tree     = np.zeros(2 * self.leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[self.leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        """
+        Sets the priorities at indices. An index given more than once keeps
+        its last priority.
+        """
+        nodes = self.leaves + np.asarray(indices)
+        self.tree[nodes] = priorities
+
+        # Bulk updates recompute every sum, one level at a time.
+        if len(nodes) >= self.leaves // 8:
+            first = self.leaves // 2
+            while first >= 1:
+                self.tree[first:2 * first] = (self.tree[2 * first:4 * first:2] +
+                                              self.tree[2 * first + 1:4 * first:2])
+                first //= 2
+            return
+
+        # Otherwise only the ancestors of the leaves, which stay sorted.
+        nodes = np.unique(nodes)
+        for level in range(self.depth):
+            nodes = nodes // 2
+            nodes = nodes[np.concatenate(([True], nodes[1:] != nodes[:-1]))]
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """
+        Returns the index of the leaf every value (from 0 to total) falls
+        in, counting the leaves' priorities off from the left. Leaves with
+        no priority are never returned.
+        """
+        values = np.array(values, dtype=float)
+        leaves = self.descend(values)
+
+        # Rounding can leave a value past the sum of the leaves, or at 0
+        # before a subtree without priority, and land it on an empty leaf.
+        # These few walk down again keeping clear of empty subtrees.
+        empty = self.tree[self.leaves + leaves] <= 0
+        if empty.any():
+            leaves[empty] = self.descend(values[empty], skipEmpty=True)
+        return leaves
+
+    def descend(self, values, skipEmpty=False):
+        """
+        Walks every value down from the root to its leaf, one level at a
+        time, and returns the leaves' indices. With skipEmpty, never into a
+        subtree without priority.
+        """
+        nodes = np.ones(len(values), dtype=np.int64)
+        for level in range(self.depth):
+            left  = self.tree[2 * nodes]
+            right = values > left
+            if skipEmpty:
+                right = np.where(self.tree[2 * nodes + 1] > 0, right | (left <= 0), False)
+            values = np.where(right, values - left, values)
+            nodes  = 2 * nodes + right
+        return nodes - self.leaves
+
+    def sample(self, n):
+        """
+        Samples n indices in proportion to their priorities, one from each
+        of n equal slices of the total.
+        """
+        values = (np.arange(n) + np.random.random_sample(n)) * (self.total() / n)
+        return self.find(values)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    A ReplayBuffer sampling transitions in proportion to their TD error
+    to the power of alpha. New transitions get the highest priority seen,
+    so they are learned from at least once, and every priority is kept
+    positive by adding epsilon to the TD error, so only the leaves of
+    transitions not stored yet have none. Sampled transitions come with
+    importance sampling weights, (size * probability) ** -beta scaled to a
+    largest weight of 1, which undo the bias of sampling them unevenly.
+    """
+    def __init__(self, capacity, numActions, numFeatures, alpha=0.6, beta=0.4,
+                 epsilon=1e-6):
+        if not epsilon > 0:
+            raise ValueError("epsilon must be positive, or transitions without "
+                             "TD error could never be sampled again")
+        ReplayBuffer.__init__(self, capacity, numActions, numFeatures)
+        self.tree        = SumTree(capacity)
+        self.alpha       = alpha
+        self.beta        = beta
+        self.epsilon     = epsilon
+        self.maxPriority = 1.0
+
+    def nbytes(self):
+        return ReplayBuffer.nbytes(self) + self.tree.tree.nbytes
+
+    def add(self, featureVector, nextFeatures, reward, isTerminal):
+        i = ReplayBuffer.add(self, featureVector, nextFeatures, reward, isTerminal)
+        self.tree.update([i], [self.maxPriority])
+        return i
+
+    def sample(self, n):
+        """
+        Samples n stored transitions in proportion to their priorities.
+
+        returns: (indices, transitions, weights), with the transitions as
+                 in get and the weights their importance sampling weights
+        """
+        indices       = self.tree.sample(n)
+        probabilities = self.tree.get(indices) / self.tree.total()
+        weights       = (self.size * probabilities) ** -self.beta
+        return indices, self.get(indices), weights / weights.max()
+
+    def updatePriorities(self, indices, differences):
+        """
+        Sets the priorities of the transitions at indices from their TD
+        errors.
+        """
+        priorities = (np.abs(differences) + self.epsilon) ** self.alpha
+        self.maxPriority = max(self.maxPriority, priorities.max())
+        self.tree.update(indices, priorities)
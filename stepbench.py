@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+#
+# End-to-end benchmark of the step loop (doomUtils.playEpisode: perception,
+# action selection and the agent's update) on every scenario, reproducible
+# from a seed: Python's and NumPy's random number generators (and with them
+# util.flipCoin) and the engine are seeded alike on every run, so the same
+# episodes are played every time.
+#
+# The games are played by ViZDoom, by its pure Python stand-in with
+# --simulator (see doomSim.py), or with --recording by playing a recording
+# back (see recorder.RecordedGame), which follows the recorded episodes
+# whatever actions are taken.
+#
+# For every scenario it reports engine ticks and decisions per second and
+# the median and 99th percentile latency per tick, every step of the loop
+# taking the time of a decision over the ticks its action is held for.
+# Results can be saved as a JSON baseline and compared with one (see
+# benchmark.compareBaseline); a scenario that plays different episodes
+# than its baseline did is pointed out, since its numbers no longer
+# measure the same work.
+#
+# usage: python stepbench.py --simulator --save baselines/steps.json
+#        python stepbench.py --simulator --compare baselines/steps.json
+#        python stepbench.py --scenario basic --episodes 20 --vizdoom-dir ../..
+#        python stepbench.py --recording recordings/supreme
+#
+
+from __future__ import print_function, division
+
+import argparse, random, sys, timeit
+import numpy as np
+import doomSim, doomUtils, extractor, recorder, train
+from benchmark import saveBaseline, loadBaseline, compareBaseline
+from qlearningAgent import ApproximateQAgent
+
+# How every metric is compared with a baseline, see
+# benchmark.compareBaseline.
+metrics = {
+    "ticksPerSecond":     (-1, 0.0),
+    "decisionsPerSecond": (-1, 0.0),
+    "p50TickSeconds":     (1, 1e-6),
+    "p99TickSeconds":     (1, 1e-6),
+}
+
+
+"""
+# Function: openGame
+# ------------------
+# Opens the game a scenario is played in, seeded.
+#
+# returns: (game, extractor, all_actions, skiprate, the kind of game)
+"""
+def openGame(scenario, options):
+    if options.recording is not None:
+        game = recorder.RecordedGame(options.recording)
+        skiprate = options.skiprate or train.scenarios[scenario]["skiprate"]
+        return (game, extractor.getExtractor(scenario), game.all_actions,
+                skiprate, "recording")
+
+    argv = ["--scenario", scenario, "--fast", "--seed", str(options.seed),
+            "--vizdoom-dir", options.vizdoom_dir]
+    if options.resolution is not None:
+        argv += ["--resolution", options.resolution]
+    if options.simulator:
+        argv += ["--simulator"]
+    engine   = train.parseArgs(argv)
+    settings = train.scenarios[scenario]
+    featureExtractor = extractor.getExtractor(scenario)
+    game = train.createGame(settings, engine, featureExtractor)
+    return (game, featureExtractor,
+            settings["actions"](game.get_available_buttons_size()),
+            options.skiprate or settings["skiprate"],
+            "simulator" if options.simulator else "vizdoom")
+
+
+"""
+# Function: benchmarkScenario
+# ---------------------------
+# Plays a number of training episodes of a scenario with a new agent,
+# timing every step of the loop.
+#
+# returns: (the name of the benchmark, its results)
+"""
+def benchmarkScenario(scenario, options):
+    random.seed(options.seed)
+    np.random.seed(options.seed)
+    doomUtils.counts.clear()
+
+    game, featureExtractor, all_actions, skiprate, kind = openGame(scenario, options)
+    agent = ApproximateQAgent(extractor=featureExtractor)
+    name  = "%s %dx%d %s" % (scenario, game.get_screen_width(),
+                             game.get_screen_height(), kind)
+
+    latencies = []
+    last = [0.0, 0]
+
+    def timeStep(state, action, reward):
+        now   = timeit.default_timer()
+        ticks = game.get_episode_time() - last[1]
+        latencies.append((now - last[0]) / max(ticks, 1))
+        last[:] = [now, game.get_episode_time()]
+
+    totalReward = 0.0
+    start = timeit.default_timer()
+    for episode in range(options.episodes):
+        game.new_episode()
+        last[:] = [timeit.default_timer(), game.get_episode_time()]
+        doomUtils.playEpisode(game, agent, scenario, all_actions,
+                              onStep=timeStep, skiprate=skiprate)
+        totalReward += game.get_total_reward()
+    elapsed = timeit.default_timer() - start
+    game.close()
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return name, {
+        "ticksPerSecond":     doomUtils.counts["ticks"] / elapsed,
+        "decisionsPerSecond": doomUtils.counts["decisions"] / elapsed,
+        "p50TickSeconds":     float(p50),
+        "p99TickSeconds":     float(p99),
+        "ticks":              int(doomUtils.counts["ticks"]),
+        "decisions":          int(doomUtils.counts["decisions"]),
+        "totalReward":        float(totalReward),
+    }
+
+
+"""
+# Function: scenariosToPlay
+# -------------------------
+# The scenarios asked for, or every scenario the game can play.
+"""
+def scenariosToPlay(options):
+    if options.recording is not None:
+        return [recorder.Recording(options.recording).scenario]
+    if options.scenario:
+        return options.scenario
+    return [s for s in sorted(train.scenarios)
+            if not options.simulator or doomSim.supports(train.scenarios[s]["config"],
+                                                          train.scenarios[s]["wad"])]
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the step loop on every scenario.")
+    parser.add_argument("--scenario", action="append", default=None,
+                        choices=sorted(train.scenarios.keys()),
+                        help="a scenario to play, can be given more than once "
+                             "(default: every scenario the game can play)")
+    games = parser.add_mutually_exclusive_group()
+    games.add_argument("--simulator", action="store_true",
+                       help="play the stand-in for the engine (doomSim.py)")
+    games.add_argument("--recording", default=None, metavar="DIR",
+                       help="play a recording back instead of the engine")
+    parser.add_argument("--episodes", type=int, default=5,
+                        help="episodes per scenario (default: 5)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random number generators and the "
+                             "engine (default: 0)")
+    parser.add_argument("--resolution", default=None,
+                        help="screen resolution, e.g. 320X240 "
+                             "(default: the scenario's)")
+    parser.add_argument("--skiprate", type=int, default=None,
+                        help="tics every action is held for "
+                             "(default: the scenario's)")
+    parser.add_argument("--vizdoom-dir", default="../..",
+                        help="ViZDoom directory the config and wad paths "
+                             "are relative to")
+    parser.add_argument("--save", default=None, metavar="PATH",
+                        help="save the results as a JSON baseline")
+    parser.add_argument("--compare", default=None, metavar="PATH",
+                        help="compare the results with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much worse than the baseline a result may "
+                             "be, relatively (default: 0.25)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = parseArgs()
+
+    results = {}
+    for scenario in scenariosToPlay(options):
+        name, result = benchmarkScenario(scenario, options)
+        results[name] = result
+        print("%-44s %10.1f ticks/s %10.1f decisions/s  per tick p50 %.3f ms "
+              "p99 %.3f ms  (%d ticks, total reward %.1f)"
+              % (name, result["ticksPerSecond"], result["decisionsPerSecond"],
+                 result["p50TickSeconds"] * 1000, result["p99TickSeconds"] * 1000,
+                 result["ticks"], result["totalReward"]))
+
+    if options.save is not None:
+        saveBaseline(options.save, results)
+        print("Baseline of %d scenarios saved to %s" % (len(results), options.save))
+
+    if options.compare is not None:
+        baseline = loadBaseline(options.compare)
+        print("Compared with %s:" % options.compare)
+        for name in sorted(results):
+            old = baseline["results"].get(name)
+            if old is not None and [old[k] for k in ["ticks", "decisions", "totalReward"]] != \
+                    [results[name][k] for k in ["ticks", "decisions", "totalReward"]]:
+                print("  Warning: %s played other episodes than the baseline's "
+                      "(%d ticks, total reward %.1f)" % (name, old["ticks"], old["totalReward"]))
+        regressions = compareBaseline(results, baseline, metrics, options.tolerance)
+        print("%d regressions" % len(regressions))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,611 @@
+#!/usr/bin/env python
+#
+# Trains and tests an approximate q-learning agent on any of our ViZDoom
+# scenarios. This replaces the copy-pasted per-scenario scripts, which are
+# now thin wrappers around it.
+#
+# usage: python train.py --scenario "health gathering supreme" --episodes 100
+#        python train.py --scenario basic --fast --seed 1
+#
+# --fast is the max-throughput mode for batch machines: no window, no sound,
+# no sleeping between actions and no per-step printing.
+#
+# --workers N trains with N actor processes and a learner (see
+# actorLearner.py), and with --hogwild as well N processes updating one
+# shared weight array (see hogwild.py); the testing episodes are still
+# played here. --envs K instead trains on K games stepped in lockstep,
+# with batched action selection and updates (see vecEnv.py).
+#
+# --pipeline K learns from every transition on a background thread while
+# the engine plays the next action, choosing actions with weights missing
+# up to K updates, and reports how busy every stage of the step loop was.
+#
+# --replay N keeps the last N transitions in a replay buffer (see
+# replay.py) and learns from a --minibatch of them after every update,
+# sampled by TD error with --prioritized. Replay only works in the
+# training loop of this process, not with --workers or --envs.
+#
+# --checkpoint PATH saves the agent and the run every --checkpoint-every
+# episodes and when training stops (see checkpoint.py); --resume PATH
+# carries on training from a checkpoint, and --evaluate PATH only plays
+# testing episodes with a checkpoint's weights. With --seed, the engine is
+# seeded anew before every episode, so a resumed run plays the episodes a
+# full run would have (checkResume.py checks that it does).
+#
+# --record DIR records the labels and depth buffers, labels, game variables,
+# actions and rewards of the episodes played here (see recorder.py).
+#
+# --simulator plays a pure Python stand-in for the engine instead (see
+# doomSim.py), which needs neither ViZDoom nor its scenario files.
+#
+
+from __future__ import print_function, division
+
+try:
+    from vizdoom import *
+    haveViZDoom = True
+except ImportError:
+    # Only the stand-in (--simulator) can be played without ViZDoom.
+    from doomSim import *
+    haveViZDoom = False
+
+from time import sleep
+from qlearningAgent import ApproximateQAgent
+import argparse, itertools as it, os, random, timeit
+import actorLearner, checkpoint, doomSim, doomUtils, extractor, hogwild, recorder, replay, vecEnv
+import numpy as np
+
+
+"""
+# Function: strafeActions
+# -----------------------
+# One action per button: [[True, False, False], [False, True, False], ...].
+"""
+def strafeActions(n):
+    return [[i == j for j in range(n)] for i in range(n)]
+
+"""
+# Function: turnActions
+# ---------------------
+# Every combination of the buttons, except turning left and turning right
+# (the first two buttons) at the same time.
+"""
+def turnActions(n):
+    return [list(a) for a in it.product([False, True], repeat=n)
+            if not (a[0] and a[1])]
+
+
+# How every scenario is set up, relative to the ViZDoom directory.
+#
+# config:     the ViZDoom config file to load
+# wad:        a scenario wad replacing the one in the config (or None)
+# resolution: the default screen resolution
+# actions:    builds the list of actions from the number of buttons
+# episodes:   how many episodes to play by default
+# test:       the fraction of the episodes played after training stops
+# sleep:      "step" to pause after every action, "episode" after every
+#             episode, when not running --fast
+# sound:      whether to turn the sound on, when not running --fast
+# skiprate:   the number of tics every chosen action is held for
+scenarios = {
+    "basic": {
+        "config":     "examples/config/basic.cfg",
+        "wad":        None,
+        "resolution": "640X480",
+        "actions":    strafeActions,
+        "episodes":   10,
+        "test":       0.5,
+        "sleep":      "episode",
+        "sound":      True,
+        "skiprate":   1,
+    },
+    "health": {
+        "config":     "examples/config/health_gathering.cfg",
+        "wad":        None,
+        "resolution": "640X480",
+        "actions":    turnActions,
+        "episodes":   10,
+        "test":       0.5,
+        "sleep":      "step",
+        "sound":      False,
+        "skiprate":   1,
+    },
+    "health gathering supreme": {
+        "config":     "examples/config/health_gathering.cfg",
+        "wad":        "scenarios/health_gathering_supreme.wad",
+        "resolution": "640X480",
+        "actions":    turnActions,
+        "episodes":   10,
+        "test":       0.5,
+        "sleep":      "step",
+        "sound":      False,
+        "skiprate":   1,
+    },
+    "defend the center": {
+        "config":     "examples/config/defend_the_center.cfg",
+        "wad":        None,
+        "resolution": "640X480",
+        "actions":    strafeActions,
+        "episodes":   10,
+        "test":       0.5,
+        "sleep":      "episode",
+        "sound":      True,
+        "skiprate":   1,
+    },
+    "defend the line": {
+        "config":     "examples/config/defend_the_line.cfg",
+        "wad":        None,
+        "resolution": "320X240",
+        "actions":    strafeActions,
+        "episodes":   30,
+        "test":       0.0,
+        "sleep":      "episode",
+        "sound":      True,
+        "skiprate":   1,
+    },
+}
+
+
+# Every buffer our old scripts turned on, and the bytes per pixel of each.
+# The automap is rendered in the screen format.
+allBuffers  = ["depth", "labels", "automap"]
+bufferBytes = {"screen": 3, "depth": 1, "labels": 1, "automap": 3}
+
+
+"""
+# Function: enabledBuffers
+# ------------------------
+# The buffers createGame enables: the extractor's, with --record the labels
+# and depth buffers as well, or every buffer when full.
+"""
+def enabledBuffers(options, featureExtractor, full=False):
+    if full:
+        return list(allBuffers)
+    buffers = list(featureExtractor.buffers)
+    if options.record is not None:
+        buffers += [b for b in ["labels", "depth"] if not b in buffers]
+    return buffers
+
+
+"""
+# Function: createGame
+# --------------------
+# Configures and initializes a DoomGame for a scenario. The engine profile
+# comes from what the scenario's extractor declares it needs: only its
+# buffers are enabled and only its game variables are put in the state.
+# With --fast, every render option, the window and the sound are turned off
+# as well and the screen is rendered in 8 bit grayscale, since no feature
+# reads the screen. Hiding the HUD makes the 3D view fill the whole screen,
+# so --fast runs see slightly more than windowed ones.
+#
+# settings:         the scenario's entry in scenarios
+# options:          the parsed command line options
+# featureExtractor: the extractor the agent is bound to
+# full:             enable every buffer and keep the config's rendering and
+#                   game variables instead (used by --measure-profile)
+#
+# --record needs the labels and depth buffers, so they are enabled with it,
+# and keeps the config's game variables after the extractor's, so other
+# extractors can be tried on the recording.
+# --simulator configures a doomSim.DoomGame the same way.
+#
+# returns: the initialized DoomGame
+"""
+def createGame(settings, options, featureExtractor, full=False):
+    game = doomSim.DoomGame() if options.simulator else DoomGame()
+
+    game.load_config(os.path.join(options.vizdoom_dir, settings["config"]))
+    if settings["wad"] is not None:
+        game.set_doom_scenario_path(os.path.join(options.vizdoom_dir,
+                                                 settings["wad"]))
+
+    resolution = options.resolution or settings["resolution"]
+    game.set_screen_resolution(getattr(ScreenResolution,
+                                       "RES_" + resolution.upper()))
+    game.set_mode(Mode.PLAYER)
+
+    buffers = enabledBuffers(options, featureExtractor, full)
+    game.set_depth_buffer_enabled("depth" in buffers)
+    game.set_labels_buffer_enabled("labels" in buffers)
+    game.set_automap_buffer_enabled("automap" in buffers)
+
+    if not full:
+        variables = list(featureExtractor.gameVariables)
+        if options.record is not None:
+            variables += [v for v in game.get_available_game_variables()
+                          if not v in variables]
+        game.clear_available_game_variables()
+        for variable in variables:
+            game.add_available_game_variable(variable)
+
+    if options.fast:
+        game.set_window_visible(False)
+        game.set_sound_enabled(False)
+    else:
+        game.set_sound_enabled(settings["sound"])
+
+    if options.fast and not full:
+        game.set_screen_format(ScreenFormat.GRAY8)
+        game.set_render_hud(False)
+        game.set_render_minimal_hud(False)
+        game.set_render_crosshair(False)
+        game.set_render_weapon(False)
+        game.set_render_decals(False)
+        game.set_render_particles(False)
+        game.set_render_effects_sprites(False)
+        game.set_render_messages(False)
+        game.set_render_screen_flashes(False)
+
+    if options.seed is not None:
+        game.set_seed(options.seed)
+
+    game.init()
+    return game
+
+
+"""
+# Function: renderedBytes
+# -----------------------
+# Estimates how many bytes of buffers the engine renders and copies to us
+# every tick.
+#
+# resolution: a tuple of the resolution (width, height)
+# buffers:    the enabled buffers
+# gray:       whether the screen (and automap) are 8 bit grayscale
+"""
+def renderedBytes(resolution, buffers, gray):
+    perPixel = 1 if gray else bufferBytes["screen"]
+    for b in buffers:
+        if b == "automap":
+            perPixel += 1 if gray else bufferBytes["automap"]
+        else:
+            perPixel += bufferBytes[b]
+    return resolution[0] * resolution[1] * perPixel
+
+
+"""
+# Function: measureTicks
+# ----------------------
+# Plays random actions for a number of ticks, getting the state every tick
+# like the step loop does.
+#
+# returns: the average seconds per tick
+"""
+def measureTicks(game, all_actions, ticks):
+    game.new_episode()
+    start = timeit.default_timer()
+    for i in range(ticks):
+        if game.is_episode_finished():
+            game.new_episode()
+        game.make_action(random.choice(all_actions))
+        game.get_state()
+    return (timeit.default_timer() - start) / ticks
+
+
+"""
+# Function: reportProfile
+# -----------------------
+# Reports what the engine profile saves per tick compared with every buffer
+# on: the estimated bytes of the buffers actually enabled (with --record,
+# the labels and depth buffers too), and with --measure-profile the
+# measured time per tick of both profiles.
+"""
+def reportProfile(game, settings, options, featureExtractor, all_actions):
+    resolution = (game.get_screen_width(), game.get_screen_height())
+    full    = renderedBytes(resolution, allBuffers, False)
+    buffers = enabledBuffers(options, featureExtractor)
+    minimal = renderedBytes(resolution, buffers, options.fast)
+    print("Engine profile: buffers %s, %d KB rendered per tick instead of %d KB"
+          % (", ".join(buffers), minimal // 1024, full // 1024))
+
+    if options.measure_profile > 0:
+        fullGame = createGame(settings, options, featureExtractor, full=True)
+        fullTick = measureTicks(fullGame, all_actions, options.measure_profile)
+        fullGame.close()
+        tick = measureTicks(game, all_actions, options.measure_profile)
+        print("Per tick: %.3f ms with every buffer, %.3f ms with the profile, "
+              "%.3f ms saved" % (fullTick * 1000, tick * 1000,
+                                 (fullTick - tick) * 1000))
+
+
+"""
+# Function: printLabels
+# ---------------------
+# Prints every object the marine can see before an action (--print-labels).
+"""
+def printLabels(state, action, reward):
+    for l in state[0].labels:
+        print("Object id:", l.object_id, "object name:", l.object_name, "label:", l.value)
+        print("Object position X:", l.object_position_x, "Y:", l.object_position_y, "Z:", l.object_position_z)
+
+
+"""
+# Function: reportUtilization
+# ---------------------------
+# Reports the share of the wall time spent in every stage of the pipelined
+# step loop (--pipeline). Busy shares adding up to more than 100% is the
+# overlap gained by learning on the background thread.
+"""
+def reportUtilization(elapsed):
+    timings = doomUtils.timings
+    stages  = ["engine", "perception", "action", "stalled", "update"]
+    print("Stage utilization:", ", ".join("%s %.1f%%" % (stage, 100 * timings[stage] / elapsed)
+                                          for stage in stages))
+    busy = sum(timings[stage] for stage in stages if stage != "stalled")
+    print("Busy time / wall time: %.2f" % (busy / elapsed))
+
+
+"""
+# Function: saveCheckpoint
+# ------------------------
+# Saves a checkpoint to options.checkpoint after a number of episodes.
+"""
+def saveCheckpoint(options, agent, episode):
+    start = timeit.default_timer()
+    size  = checkpoint.save(options.checkpoint, agent, options.scenario, episode)
+    print("Checkpoint after episode %d saved to %s (%d bytes, %.1f ms)"
+          % (episode, options.checkpoint, size,
+             (timeit.default_timer() - start) * 1000))
+
+
+"""
+# Function: loadCheckpoint
+# ------------------------
+# Loads a checkpoint of the scenario being played into the agent.
+#
+# returns: the checkpoint
+"""
+def loadCheckpoint(path, scenario, agent):
+    saved = checkpoint.load(path)
+    if str(saved["scenario"]) != scenario:
+        raise ValueError("%s is a checkpoint of %s, not %s"
+                         % (path, saved["scenario"], scenario))
+    missing = checkpoint.restoreAgent(saved, agent)
+    if missing:
+        print("Not in the checkpoint, starting at 0:", ", ".join(missing))
+    return saved
+
+
+"""
+# Function: run
+# -------------
+# Plays the training and then the testing episodes of a scenario.
+#
+# options: the parsed command line options
+#
+# returns: the agent, after all episodes
+"""
+def run(options):
+    scenario = options.scenario
+    settings = scenarios[scenario]
+
+    if options.seed is not None:
+        random.seed(options.seed)
+        np.random.seed(options.seed)
+
+    episodes = options.episodes
+    if episodes is None:
+        episodes = settings["episodes"]
+    test = options.test
+    if test is None:
+        test = settings["test"]
+    trainingEpisodes = episodes - int(round(episodes * test))
+
+    featureExtractor = extractor.getExtractor(scenario)
+
+    game        = createGame(settings, options, featureExtractor)
+    all_actions = settings["actions"](game.get_available_buttons_size())
+    agent       = ApproximateQAgent(extractor=featureExtractor)
+    if options.replay > 0:
+        bufferClass  = (replay.PrioritizedReplayBuffer if options.prioritized
+                        else replay.ReplayBuffer)
+        agent.replay = bufferClass(options.replay, len(all_actions),
+                                   len(featureExtractor.featureNames))
+        agent.minibatch = options.minibatch
+        print("Replay buffer: %d transitions, %d KB"
+              % (options.replay, agent.replay.nbytes() // 1024))
+
+    reportProfile(game, settings, options, featureExtractor, all_actions)
+
+    # Sets time that will pause the engine after each action (in seconds)
+    # Without this everything would go too fast for you to keep track of what's happening.
+    sleep_time = 0 if options.fast else 1 / DEFAULT_TICRATE
+    step_sleep = sleep_time if settings["sleep"] == "step" else 0
+    onSteps    = []
+    if options.print_labels and not options.fast:
+        onSteps.append(printLabels)
+    record = None
+    if options.record is not None:
+        record = recorder.Recorder(options.record, scenario, all_actions,
+                                   options.record_every, options.record_scale,
+                                   [doomSim.nameOf(v) for v in
+                                    game.get_available_game_variables()])
+        onSteps.append(record.record)
+
+    def callOnSteps(state, action, reward):
+        for f in onSteps:
+            f(state, action, reward)
+    onStep = callOnSteps if onSteps else None
+    skiprate   = options.skiprate or settings["skiprate"]
+
+    first = 0
+    if options.resume is not None:
+        first = checkpoint.restoreRun(loadCheckpoint(options.resume, scenario, agent))
+        print("Resuming after episode", first)
+    elif options.evaluate is not None:
+        loadCheckpoint(options.evaluate, scenario, agent)
+        trainingEpisodes = 0
+        print("Evaluating the weights of", options.evaluate)
+
+    start = timeit.default_timer()
+    if options.envs > 1 and trainingEpisodes > 0:
+        agent = vecEnv.trainVectorized(options, trainingEpisodes)
+        first = trainingEpisodes
+    elif options.workers > 1 and trainingEpisodes > 0:
+        if options.hogwild:
+            agent = hogwild.trainHogwild(options, trainingEpisodes)
+        else:
+            agent = actorLearner.trainActors(options, trainingEpisodes)
+        first = trainingEpisodes
+
+    training = True
+    for i in range(first, episodes):
+        if training and i >= trainingEpisodes:
+            training = False
+            if options.checkpoint is not None and i > 0:
+                saveCheckpoint(options, agent, i)
+            agent.stopTraining()
+            print("Ending training mode.")
+            print("Entering testing mode.")
+
+        # Seeding the engine per episode makes every episode independent of
+        # those played before it, so a resumed run plays what a full run
+        # would have.
+        if options.seed is not None:
+            game.set_seed(options.seed + i)
+        game.new_episode()
+        if record is not None:
+            record.startEpisode()
+
+        if options.pipeline > 0:
+            doomUtils.playEpisodePipelined(game, agent, scenario, all_actions,
+                                           step_sleep, onStep, skiprate,
+                                           options.pipeline)
+        else:
+            doomUtils.playEpisode(game, agent, scenario, all_actions, step_sleep,
+                                  onStep, skiprate)
+
+        if settings["sleep"] == "episode" and sleep_time > 0:
+            sleep(sleep_time)
+
+        if record is not None:
+            record.endEpisode(game.get_total_reward())
+
+        print("Episode #" + str(i + 1), "total reward:", game.get_total_reward())
+
+        if (training and options.checkpoint is not None and
+            (i + 1) % options.checkpoint_every == 0 and i + 1 < trainingEpisodes):
+            saveCheckpoint(options, agent, i + 1)
+
+    # Runs without testing episodes train until the end.
+    if training and options.checkpoint is not None and episodes > 0:
+        saveCheckpoint(options, agent, max(first, episodes))
+
+    elapsed   = timeit.default_timer() - start
+    ticks     = doomUtils.counts["ticks"]
+    decisions = doomUtils.counts["decisions"]
+    print("Engine ticks:", ticks, "decisions:", decisions,
+          "observations:", doomUtils.counts["observations"])
+    if elapsed > 0:
+        print("Ticks per second: %.1f, decisions per second: %.1f"
+              % (ticks / elapsed, decisions / elapsed))
+    if options.pipeline > 0:
+        reportUtilization(elapsed)
+    if record is not None:
+        record.close()
+        print("Recorded %d frames of %d episodes to %s"
+              % (record.frames, record.episodes, options.record))
+
+    game.close()
+    return agent
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Train and test a q-learning agent on a ViZDoom scenario.")
+    parser.add_argument("--scenario", default="basic",
+                        choices=sorted(scenarios.keys()))
+    parser.add_argument("--episodes", type=int, default=None,
+                        help="number of episodes (default: per scenario)")
+    parser.add_argument("--test", type=float, default=None,
+                        help="fraction of the episodes to play after "
+                             "training stops (default: per scenario)")
+    parser.add_argument("--resolution", default=None,
+                        help="screen resolution, e.g. 320X240 "
+                             "(default: per scenario)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the engine and the agent")
+    parser.add_argument("--skiprate", type=int, default=None,
+                        help="tics to hold every chosen action for "
+                             "(default: per scenario)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="train with this many actor processes, each "
+                             "with its own engine, and a learner")
+    parser.add_argument("--hogwild", action="store_true",
+                        help="with --workers, have every process update "
+                             "one weight array in shared memory, without "
+                             "locks, instead of sending transitions to a "
+                             "learner")
+    parser.add_argument("--sync-every", type=int, default=64, metavar="UPDATES",
+                        help="with --workers, how often the learner "
+                             "publishes its weights to the actors")
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="with --workers, how many transitions the "
+                             "actors send the learner at a time")
+    parser.add_argument("--envs", type=int, default=1,
+                        help="train on this many games stepped in lockstep, "
+                             "each in its own process")
+    parser.add_argument("--pipeline", type=int, default=0, metavar="STALENESS",
+                        help="learn on a background thread while the engine "
+                             "plays, with weights missing up to STALENESS "
+                             "updates (default: 0, not pipelined)")
+    parser.add_argument("--replay", type=int, default=0, metavar="CAPACITY",
+                        help="also learn from minibatches of the last "
+                             "CAPACITY transitions (default: 0, no replay)")
+    parser.add_argument("--minibatch", type=int, default=32,
+                        help="with --replay, how many transitions to "
+                             "learn from after every update")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="with --replay, sample transitions in "
+                             "proportion to their TD error")
+    parser.add_argument("--checkpoint", default=None, metavar="PATH",
+                        help="save the agent and the run to PATH "
+                             "periodically and when training stops")
+    parser.add_argument("--checkpoint-every", type=int, default=10,
+                        metavar="EPISODES",
+                        help="with --checkpoint, how often to save "
+                             "while training (default: 10)")
+    loading = parser.add_mutually_exclusive_group()
+    loading.add_argument("--resume", default=None, metavar="PATH",
+                         help="carry on training from a checkpoint")
+    loading.add_argument("--evaluate", default=None, metavar="PATH",
+                         help="load a checkpoint's weights and only play "
+                              "testing episodes")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="record the episodes played in this process "
+                             "to DIR")
+    parser.add_argument("--record-every", type=int, default=1, metavar="N",
+                        help="with --record, record every Nth decision")
+    parser.add_argument("--record-scale", type=int, default=1, metavar="S",
+                        help="with --record, keep every Sth row and column "
+                             "of the buffers")
+    parser.add_argument("--vizdoom-dir", default="../..",
+                        help="ViZDoom directory the config and wad paths "
+                             "are relative to")
+    parser.add_argument("--simulator", action="store_true",
+                        help="play the pure Python stand-in for the engine "
+                             "(doomSim.py) instead of ViZDoom")
+    parser.add_argument("--fast", action="store_true",
+                        help="max throughput: no window, no sound, no "
+                             "sleeping and no per-step printing")
+    parser.add_argument("--measure-profile", type=int, default=0, metavar="TICKS",
+                        help="measure the time per tick with every buffer "
+                             "on and with the extractor's profile")
+    parser.add_argument("--print-labels", action="store_true",
+                        help="print the objects in view before every action")
+    options = parser.parse_args(argv)
+    if options.resume is not None and (options.workers > 1 or options.envs > 1):
+        parser.error("--resume does not work with --workers or --envs")
+    if (options.replay > 0 or options.prioritized) and (options.workers > 1 or options.envs > 1):
+        parser.error("--replay and --prioritized do not work with --workers or --envs")
+    if options.simulator:
+        settings = scenarios[options.scenario]
+        if not doomSim.supports(settings["config"], settings["wad"]):
+            parser.error("the simulator has no world for %s" % options.scenario)
+    elif not haveViZDoom:
+        parser.error("ViZDoom is not installed; use --simulator")
+    return options
+
+
+if __name__ == "__main__":
+    run(parseArgs())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+#
+# A batch of DoomGames stepped in lockstep (train.py --envs K).
+#
+# Each of the K games runs in its own process, which extracts the features
+# of its frames with the scenario's extractor and sends back only the
+# feature matrix (one row per action). reset() and step(actions) return
+# the K matrices stacked into one (K x actions x features) array, so the
+# agent scores and picks the actions of every game with one matrix product
+# (ApproximateQAgent.getBatchActions) and learns from the K transitions in
+# one update (ApproximateQAgent.learnBatch). The K updates, all computed
+# with the weights from before the step, are averaged: summed, they would
+# move the weights K times as far as one update of alpha does, and
+# diverge for large K. A batched step is thus one step of size alpha
+# towards the K games' mean target. A game whose episode ends is
+# started again right away; step reports it as done and returns the first
+# frame of its next episode.
+#
+# usage: python train.py --scenario "health gathering supreme" --fast --envs 8
+#
+
+from __future__ import print_function, division
+
+from qlearningAgent import ApproximateQAgent
+import multiprocessing, timeit
+import numpy as np
+import actorLearner, doomUtils, extractor, train, util
+
+
+"""
+# Function: envProcess
+# --------------------
+# Runs one game of a VecDoomGame, always in --fast mode, answering the
+# commands sent over its pipe:
+#
+# ("reset", None):   starts a new episode, answers its feature matrix
+# ("step", action):  holds the action with that index for skiprate tics and
+#                    answers (feature matrix, reward, done, total reward).
+#                    When the episode ended, the total reward is the
+#                    episode's and a new episode has been started.
+# ("counts", None):  answers the process's doomUtils.counts
+# ("close", None):   closes the game and exits
+"""
+def envProcess(workerId, options, pipe):
+    options  = actorLearner.workerOptions(workerId, options)
+    scenario = options.scenario
+    settings = train.scenarios[scenario]
+    featureExtractor = extractor.getExtractor(scenario)
+
+    game        = train.createGame(settings, options, featureExtractor)
+    all_actions = settings["actions"](game.get_available_buttons_size())
+    skiprate    = options.skiprate or settings["skiprate"]
+    counts      = doomUtils.counts
+
+    def observe():
+        state = doomUtils.getGameState(game, scenario, all_actions)
+        return featureExtractor.getFeatureMatrix(state)
+
+    while True:
+        command, argument = pipe.recv()
+
+        if command == "reset":
+            game.new_episode()
+            pipe.send(observe())
+
+        elif command == "step":
+            start  = game.get_episode_time()
+            reward = game.make_action(all_actions[argument], skiprate)
+            counts["ticks"]     += game.get_episode_time() - start
+            counts["decisions"] += 1
+
+            done  = game.is_episode_finished()
+            total = 0.0
+            if done:
+                total = game.get_total_reward()
+                game.new_episode()
+            pipe.send((observe(), reward, done, total))
+
+        elif command == "counts":
+            pipe.send(dict(counts))
+
+        elif command == "close":
+            game.close()
+            pipe.close()
+            return
+
+
+class VecDoomGame():
+    """
+    K DoomGames of one scenario, each in its own process, stepped in
+    lockstep. Observations are feature matrices, see the top of the file.
+    """
+    def __init__(self, options, k):
+        self.pipes     = []
+        self.processes = []
+        for i in range(k):
+            pipe, child = multiprocessing.Pipe()
+            p = multiprocessing.Process(target=envProcess, args=(i, options, child))
+            p.daemon = True
+            p.start()
+            child.close()
+            self.pipes.append(pipe)
+            self.processes.append(p)
+
+    def __len__(self):
+        return len(self.pipes)
+
+    def reset(self):
+        """
+        Starts a new episode in every game.
+
+        returns: the (K x actions x features) feature matrices
+        """
+        for pipe in self.pipes:
+            pipe.send(("reset", None))
+        return np.array([pipe.recv() for pipe in self.pipes])
+
+    def step(self, actions):
+        """
+        Takes the action with index actions[i] in game i, restarting the
+        games whose episodes end.
+
+        returns: (features, rewards, dones, totalRewards): the feature
+                 matrices of the next frames, the rewards, which episodes
+                 ended, and the total rewards of the episodes that ended
+                 (0 for the others)
+        """
+        for pipe, action in zip(self.pipes, actions):
+            pipe.send(("step", int(action)))
+        features, rewards, dones, totals = zip(*[pipe.recv() for pipe in self.pipes])
+        return (np.array(features), np.array(rewards, dtype=float),
+                np.array(dones, dtype=bool), np.array(totals, dtype=float))
+
+    def getCounts(self):
+        """
+        Returns the doomUtils.counts of all the games added up.
+        """
+        counts = util.Counter()
+        for pipe in self.pipes:
+            pipe.send(("counts", None))
+        for pipe in self.pipes:
+            for key, value in pipe.recv().items():
+                counts[key] += value
+        return counts
+
+    def close(self):
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        for p in self.processes:
+            p.join()
+        for pipe in self.pipes:
+            pipe.close()
+
+
+"""
+# Function: trainVectorized
+# -------------------------
+# Trains an agent on options.envs games stepped in lockstep, until the
+# given number of episodes have ended. The games' counts are added to
+# doomUtils.counts.
+#
+# options:  the parsed command line options
+# episodes: how many training episodes to play, over all games
+#
+# returns: the trained agent
+"""
+def trainVectorized(options, episodes):
+    featureExtractor = extractor.getExtractor(options.scenario)
+    agent            = ApproximateQAgent(extractor=featureExtractor)
+    envs             = VecDoomGame(options, max(1, min(options.envs, episodes)))
+    games            = np.arange(len(envs))
+
+    start    = timeit.default_timer()
+    played   = 0
+    features = envs.reset()
+    while played < episodes:
+        actions = agent.getBatchActions(features)
+        nextFeatures, rewards, dones, totals = envs.step(actions)
+        agent.learnBatch(features[games, actions], nextFeatures, rewards, dones,
+                         average=True)
+
+        # Games finishing together may end a few more episodes than asked
+        # for; they are learned from, but not counted.
+        for i in np.flatnonzero(dones)[:episodes - played]:
+            played += 1
+            print("Episode #" + str(played), "(game " + str(i) + ")",
+                  "total reward:", totals[i])
+        features = nextFeatures
+
+    for key, value in envs.getCounts().items():
+        doomUtils.counts[key] += value
+    envs.close()
+
+    elapsed = timeit.default_timer() - start
+    if elapsed > 0:
+        print("Games: %d, batched steps: %d, decisions per second: %.1f"
+              % (len(envs), agent.updates,
+                 agent.updates * len(envs) / elapsed))
+    return agent